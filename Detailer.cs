@@ -231,7 +231,8 @@ public static class Detailer
                     ["mask"] = new JArray() { grownMaskNode, 0 },
                     ["sort_order"] = g.UserInput.Get(DetailSortOrder, "left-right"),
                     ["index"] = indexedMask.Index - 1,
-                    ["orig_mask"] = new JArray() { baseMaskNode, 0 }
+                    ["orig_mask"] = new JArray() { baseMaskNode, 0 },
+                    ["min_area"] = g.UserInput.Get(DetailMinMaskArea, 0)
                 });
             case InvertMask invertMask:
                 return g.CreateNode("InvertMask", new JObject()
@@ -256,6 +257,8 @@ public static class Detailer
                     ["mask_a"] = new JArray() { GenerateMaskNodes(g, unionMask.Left, context), 0 },
                     ["mask_b"] = new JArray() { GenerateMaskNodes(g, unionMask.Right, context), 0 },
                     ["op"] = "max",
+                    // Every mask of a segment expression is derived from the same image, so mask_b may be skipped
+                    ["same_size"] = true,
                 });
             case IntersectMask intersectMask:
                 return g.CreateNode("WCCompositeMask", new JObject()
@@ -263,6 +266,7 @@ public static class Detailer
                     ["mask_a"] = new JArray() { GenerateMaskNodes(g, intersectMask.Left, context), 0 },
                     ["mask_b"] = new JArray() { GenerateMaskNodes(g, intersectMask.Right, context), 0 },
                     ["op"] = "min",
+                    ["same_size"] = true,
                 });
             case BoundingBoxMask boundingBoxMask:
                 return g.CreateNode("WCBoundingBoxMask", new JObject()
@@ -311,7 +315,7 @@ public static class Detailer
 
     private static T2IRegisteredParam<bool> DetailDynamicResolution;
     private static T2IRegisteredParam<string> DetailSortOrder, DetailTargetResolution, SaveDetailMask;
-    private static T2IRegisteredParam<int> DetailMaskBlur, DetailMaskGrow, DetailMaskOversize, DetailSteps, DetailFeatureThreshold;
+    private static T2IRegisteredParam<int> DetailMaskBlur, DetailMaskGrow, DetailMaskOversize, DetailSteps, DetailFeatureThreshold, DetailMinMaskArea, SaveDetailMaskMaxSize;
     private static T2IRegisteredParam<double> DetailThresholdMax, DetailCFGScale;
     private static T2IRegisteredParam<T2IModel> DetailModel;
     private static T2IParamGroup GroupDetailRefining, GroupDetailOverrides;
@@ -319,11 +323,14 @@ public static class Detailer
     {
         GroupDetailRefining = new("WC Detailer", Open: false, OrderPriority: 9.5, IsAdvanced: false);
         SaveDetailMask = T2IParamTypes.Register<string>(new("WC Save Detail Mask Style", 
-            $"If set, any usage of '<{DIRECTIVE}:>' syntax in prompts will save the generated mask in output.\nSet to 'MaskOnly' to output the mask with a black background.\nSet to 'MaskAndImage' to output the mask overlayed on top of the input image.",
+            $"If set, any usage of '<{DIRECTIVE}:>' syntax in prompts will save the generated mask in output.\nSet to 'MaskOnly' to output the mask with a black background.\nSet to 'MaskAndImage' to output all masks overlayed on top of the input image (before any detailing) in one image, each in its own color.",
             "Disabled", GetValues: (_) => ["Disabled///Disabled", "MaskOnly///MaskOnly", "MaskAndImage///MaskAndImage"]
             , IgnoreIf: "Disabled", Group: GroupDetailRefining, OrderPriority: 3,
             HideFromMetadata: true
             ));
+        SaveDetailMaskMaxSize = T2IParamTypes.Register<int>(new("WC Save Detail Mask Max Size", "If set, saved 'MaskAndImage' detail masks are downscaled so their longest edge is at most this many pixels.\nThe overlay is made at that size, so diagnostic saves of large images cost almost nothing.",
+            "1024", Min: 64, Max: 16384, Step: 64, Toggleable: true, Group: GroupDetailRefining, Examples: ["512", "1024", "2048"], OrderPriority: 3.5
+            ));
         DetailMaskBlur = T2IParamTypes.Register<int>(new("WC Detail Mask Blur", $"Amount of blur to apply to the detail mask before using it.\nThis is for '<{DIRECTIVE}:>' syntax usage.\nDefaults to 10.\nCan be overridden by '<{DIRECTIVE}:[blur:10]>' syntax.",
             "10", Min: 0, Max: 64, Group: GroupDetailRefining, Examples: ["0", "4", "8", "16"], Toggleable: true, OrderPriority: 4
             ));
@@ -336,6 +343,9 @@ public static class Detailer
         DetailFeatureThreshold = T2IParamTypes.Register<int>(new("WC Detail Feature Threshold", $"Number of pixels that can separate masked areas while still considering them as a single feature.\nUsed when using the indexing syntax to extract a feature from a non-YOLO mask.",
             "16", Min: 0, Max: 128, Group: GroupDetailRefining, Examples: ["0", "4", "8", "16"], Toggleable: true, OrderPriority: 5.7
             ));
+        DetailMinMaskArea = T2IParamTypes.Register<int>(new("WC Detail Min Mask Area", $"Minimum number of masked pixels for a detail mask to be refined.\nPixels are counted before the mask blur and grow are applied.\nSmaller masks (eg stray pixels from a segmenter) skip the crop, encode and sampling entirely.\nWith the indexing syntax on non-YOLO masks, smaller features are also ignored when sorting and indexing.\nThis is for '<{DIRECTIVE}:>' syntax usage.\nDefaults to 0 (only empty masks are skipped).",
+            "0", Min: 0, Max: 65536, Group: GroupDetailRefining, Examples: ["0", "64", "256", "1024"], Toggleable: true, OrderPriority: 5.8
+            ));
         DetailThresholdMax = T2IParamTypes.Register<double>(new("WC Detail Threshold Max", "Maximum mask match value of a detail mask before clamping.\nLower values force more of the mask to be counted as maximum masking.\nToo-low values may include unwanted areas of the image.\nHigher values may soften the mask.",
             "1", Min: 0, Max: 1, Step: 0.05, Toggleable: true, ViewType: ParamViewType.SLIDER, Group: GroupDetailRefining, OrderPriority: 6
             ));
@@ -397,6 +407,10 @@ public static class Detailer
                 PromptRegion negativeRegion = new(g.UserInput.Get(T2IParamTypes.NegativePrompt, ""));
                 PromptRegion.Part[] negativeParts = [.. negativeRegion.Parts.Where(p => p.Type == PromptRegion.PartType.CustomPart && p.Prefix == DIRECTIVE)];
                 int growAmt = g.UserInput.Get(DetailMaskGrow, 16);
+                // MaskAndImage saves are collected and written as one colour-coded overlay on the pre-detail image after the loop
+                JArray overlayImage = g.FinalImageOut;
+                JArray overlayMasks = null;
+                int overlaySegments = 0;
                 for (int i = 0; i < parts.Length; i++)
                 {
                     PromptRegion.Part part = parts[i];
@@ -413,6 +427,8 @@ public static class Detailer
                         continue;
                     }
                     string segmentNode = GenerateMaskNodes(g, maskSpec);
+                    // The minimum area gate measures the mask before it is blurred and grown
+                    string areaMaskNode = segmentNode;
                     if (detailerParams.Blur > 0)
                     {
                         segmentNode = g.CreateNode("SwarmMaskBlur", new JObject()
@@ -443,12 +459,20 @@ public static class Detailer
                     }
                     else if (saveDetailMask == "MaskAndImage")
                     {
-                        string imageNode = g.CreateNode("WCMaskOverlay", new JObject()
+                        overlaySegments++;
+                        if (overlayMasks is null)
                         {
-                            ["image"] = g.FinalImageOut,
-                            ["mask"] = new JArray() { segmentNode, 0 }
-                        });
-                        g.CreateImageSaveNode([imageNode, 0], g.GetStableDynamicID(50000, 0));
+                            overlayMasks = [segmentNode, 0];
+                        }
+                        else
+                        {
+                            string batchNode = g.CreateNode("WCMaskBatch", new JObject()
+                            {
+                                ["mask_a"] = overlayMasks,
+                                ["mask_b"] = new JArray() { segmentNode, 0 }
+                            });
+                            overlayMasks = [batchNode, 0];
+                        }
                     }
                     int oversize = g.UserInput.Get(DetailMaskOversize, 16);
                     g.MaskShrunkInfo = CreateImageMaskCrop(g, [segmentNode, 0], g.FinalImageOut, oversize, vae, g.FinalLoadedModel, thresholdMax: g.UserInput.Get(DetailThresholdMax, 1));
@@ -470,13 +494,27 @@ public static class Detailer
                     var recompositedImage = g.RecompositeCropped(g.MaskShrunkInfo.BoundsNode, [g.MaskShrunkInfo.CroppedMask, 0], g.FinalImageOut, [decoded, 0]);
                     var conditionalImage = g.CreateNode("WCSkipIfMaskEmpty", new JObject()
                     {
-                        ["mask"] = new JArray() { segmentNode, 0 },
+                        ["mask"] = new JArray() { areaMaskNode, 0 },
                         ["image_if_empty"] = g.FinalImageOut,
                         ["image_if_not_empty"] = recompositedImage,
+                        ["min_area"] = g.UserInput.Get(DetailMinMaskArea, 0),
+                        ["threshold"] = 0.01,
                     });
                     g.FinalImageOut = [conditionalImage, 0];
                     g.MaskShrunkInfo = new(null, null, null, null);
                 }
+                if (overlayMasks is not null)
+                {
+                    string imageNode = g.CreateNode("WCMaskOverlay", new JObject()
+                    {
+                        ["image"] = overlayImage,
+                        ["mask"] = overlayMasks,
+                        // A single segment keeps the high-contrast colour of a plain overlay
+                        ["color"] = overlaySegments == 1 ? "auto" : "palette",
+                        ["max_preview_edge"] = g.UserInput.Get(SaveDetailMaskMaxSize, 0)
+                    });
+                    g.CreateImageSaveNode([imageNode, 0], g.GetStableDynamicID(50000, 0));
+                }
             }
         },
             // same priority as <segment>
@@ -485,55 +523,40 @@ public static class Detailer
     
     public static WorkflowGenerator.ImageMaskCropData CreateImageMaskCrop(WorkflowGenerator g, JArray mask, JArray image, int growBy, JArray vae, T2IModel model, double threshold = 0.01, double thresholdMax = 1)
     {
-        if (threshold > 0)
-        {
-            string thresholded = g.CreateNode("SwarmMaskThreshold", new JObject()
-            {
-                ["mask"] = mask,
-                ["min"] = threshold,
-                ["max"] = thresholdMax
-            });
-            mask = [thresholded, 0];
-        }
         bool dynamicRes = g.UserInput.Get(DetailDynamicResolution, false);
         string targetRes = g.UserInput.Get(DetailTargetResolution, "0x0");
         (string targetWidth, string targetHeight) = targetRes.BeforeAndAfter('x');
         int targetX = int.Parse(targetWidth);
         int targetY = int.Parse(targetHeight);
         bool isCustomRes = targetX > 0 && targetY > 0;
-        string boundsNode = g.CreateNode("WCMaskBounds", new JObject()
+        // WCCropToMask thresholds, computes the bounds and crops the image and mask in one node.
+        // Outputs 0-3 are the bounds (x, y, width, height), 4 is the cropped image and 5 the cropped mask.
+        // CroppedMask must be a node with the mask as output 0, so the mask is exposed through WCCroppedMask.
+        string cropNode = g.CreateNode("WCCropToMask", new JObject()
         {
+            ["image"] = image,
             ["mask"] = mask,
             ["grow"] = growBy,
+            ["threshold"] = threshold,
+            ["threshold_max"] = thresholdMax,
             ["aspect_x"] = isCustomRes ? targetX : 0,
             ["aspect_y"] = isCustomRes ? targetY : 0,
             ["dynamic"] = dynamicRes
         });
-        string croppedImage = g.CreateNode("SwarmImageCrop", new JObject()
+        JArray croppedImage = [cropNode, 4];
+        string croppedMask = g.CreateNode("WCCroppedMask", new JObject()
         {
-            ["image"] = image,
-            ["x"] = new JArray() { boundsNode, 0 },
-            ["y"] = new JArray() { boundsNode, 1 },
-            ["width"] = new JArray() { boundsNode, 2 },
-            ["height"] = new JArray() { boundsNode, 3 }
-        });
-        string croppedMask = g.CreateNode("CropMask", new JObject()
-        {
-            ["mask"] = mask,
-            ["x"] = new JArray() { boundsNode, 0 },
-            ["y"] = new JArray() { boundsNode, 1 },
-            ["width"] = new JArray() { boundsNode, 2 },
-            ["height"] = new JArray() { boundsNode, 3 }
+            ["mask"] = new JArray() { cropNode, 5 }
         });
         string scaledImage = g.CreateNode("SwarmImageScaleForMP", new JObject()
         {
-            ["image"] = new JArray() { croppedImage, 0 },
+            ["image"] = croppedImage,
             ["width"] = isCustomRes ? targetX : model?.StandardWidth <= 0 ? g.UserInput.GetImageWidth() : model.StandardWidth,
             ["height"] = isCustomRes ? targetY : model?.StandardHeight <= 0 ? g.UserInput.GetImageHeight() : model.StandardHeight,
             ["can_shrink"] = !dynamicRes
         });
         JArray encoded = g.DoMaskedVAEEncode(vae, [scaledImage, 0], [croppedMask, 0], null);
-        return new(boundsNode, croppedMask, $"{encoded[0]}", scaledImage);
+        return new(cropNode, croppedMask, $"{encoded[0]}", scaledImage);
     }
 
 }
\ No newline at end of file
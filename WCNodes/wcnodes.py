@@ -1,24 +1,605 @@
-import torch, comfy
+import hashlib
+import logging
+import math
+import os
+import threading
+from collections import OrderedDict
+import torch
 import numpy as np
 from scipy import ndimage
 
+# Memory budget for the full-frame temporaries of a single node call.  When a node's estimated peak would
+# exceed it, the canvas is processed in bands of rows instead.  Every pixel goes through exactly the same
+# operations either way, so tiled results are bit-identical to untiled ones.
+# Set with the WC_TILE_BUDGET_MB environment variable or set_tile_budget(); 0 disables tiling.
+TILE_BUDGET_BYTES = int(float(os.environ.get("WC_TILE_BUDGET_MB", "512")) * 1024 * 1024)
+
+def set_tile_budget(megabytes):
+    """Sets the memory budget (in MB) used to decide when nodes process the canvas in row bands."""
+    global TILE_BUDGET_BYTES
+    TILE_BUDGET_BYTES = int(megabytes * 1024 * 1024)
+
+def row_bands(height, width, bytes_per_pixel):
+    """
+    Splits a canvas into bands of rows so the temporaries of each band fit in the memory budget.
+
+    Args:
+        height, width: Canvas size in pixels
+        bytes_per_pixel: Estimated peak temporary bytes per pixel of the kernel being run
+
+    Returns:
+        List of (start, end) row ranges covering the canvas, a single band when it fits the budget
+    """
+    row_bytes = max(1, width * bytes_per_pixel)
+    if TILE_BUDGET_BYTES <= 0 or height * row_bytes <= TILE_BUDGET_BYTES:
+        return [(0, height)]
+    rows = max(1, TILE_BUDGET_BYTES // row_bytes)
+    return [(start, min(height, start + rows)) for start in range(0, height, rows)]
+
+# Pool of reusable tensors keyed by (shape, dtype, device), so repeated node calls at the same resolution
+# reuse the scratch buffers of their kernels (band temporaries, blend alphas, scanline fill edges) instead of
+# churning the allocator.  Only intermediates go through the pool and each is released as soon as it is
+# used; node outputs are allocated normally, since ComfyUI keeps them.  Retained buffers are bounded by
+# WC_BUFFER_POOL_MB (or set_buffer_pool_size()), evicting the least recently released first; 0 disables pooling.
+BUFFER_POOL_BYTES = int(float(os.environ.get("WC_BUFFER_POOL_MB", "256")) * 1024 * 1024)
+
+class BufferPool:
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        # key -> list of free tensors, ordered from least to most recently released key
+        self._free = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes_retained = 0
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(shape, dtype, device):
+        return (tuple(shape), dtype, torch.device(device))
+
+    def acquire(self, shape, dtype=torch.float32, device="cpu"):
+        """Returns a tensor with undefined contents, reusing a released one of the same key if available."""
+        key = self._key(shape, dtype, device)
+        with self._lock:
+            free = self._free.get(key)
+            if free:
+                tensor = free.pop()
+                if not free:
+                    del self._free[key]
+                self.bytes_retained -= tensor.numel() * tensor.element_size()
+                self.hits += 1
+                return tensor
+            self.misses += 1
+        return torch.empty(key[0], dtype=dtype, device=key[2])
+
+    def release(self, tensor):
+        """Returns a tensor that is no longer referenced anywhere else to the pool."""
+        size = tensor.numel() * tensor.element_size()
+        if size > self.max_bytes or not tensor.is_contiguous():
+            return
+        key = self._key(tensor.shape, tensor.dtype, tensor.device)
+        with self._lock:
+            self._free.setdefault(key, []).append(tensor)
+            self._free.move_to_end(key)
+            self.bytes_retained += size
+            while self.bytes_retained > self.max_bytes:
+                oldest, free = next(iter(self._free.items()))
+                evicted = free.pop(0)
+                if not free:
+                    del self._free[oldest]
+                self.bytes_retained -= evicted.numel() * evicted.element_size()
+
+    def clear(self):
+        with self._lock:
+            self._free.clear()
+            self.bytes_retained = 0
+
+    def stats(self):
+        with self._lock:
+            requests = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / requests if requests else 0.0,
+                "bytes_retained": self.bytes_retained,
+                "buffers": sum(len(free) for free in self._free.values()),
+            }
+
+_buffer_pool = BufferPool(BUFFER_POOL_BYTES)
+
+def clear_buffer_pool():
+    """Drops every buffer retained by the buffer pool."""
+    _buffer_pool.clear()
+
+def set_buffer_pool_size(megabytes):
+    """Sets the maximum memory (in MB) retained by the buffer pool, evicting as needed; 0 disables it."""
+    global BUFFER_POOL_BYTES
+    BUFFER_POOL_BYTES = int(megabytes * 1024 * 1024)
+    _buffer_pool.max_bytes = BUFFER_POOL_BYTES
+    _buffer_pool.clear()
+
+def buffer_pool_stats():
+    """Returns the buffer pool's hits, misses, hit_rate, bytes_retained and number of retained buffers."""
+    return _buffer_pool.stats()
+
+def pooled_empty(shape, dtype=torch.float32, device="cpu"):
+    """Returns an uninitialized tensor from the buffer pool."""
+    return _buffer_pool.acquire(shape, dtype, device)
+
+def pooled_zeros(shape, dtype=torch.float32, device="cpu"):
+    """Returns a zero-filled tensor from the buffer pool."""
+    return _buffer_pool.acquire(shape, dtype, device).zero_()
+
+def release_buffer(tensor):
+    """Releases an intermediate tensor from pooled_empty/pooled_zeros back to the pool."""
+    _buffer_pool.release(tensor)
+
+# Shared thread pool for the per-item CPU geometry of batch nodes (labelling, hulls, distance fields, shape
+# fills).  The numpy, scipy and torch kernels doing that work release the GIL, so batch items run concurrently.
+# Size it with WC_GEOMETRY_WORKERS or set_geometry_workers(); 1 disables it.  Batches smaller than
+# GEOMETRY_MIN_PIXELS in total run serially, where the pool would cost more than it saves.
+GEOMETRY_WORKERS = int(os.environ.get("WC_GEOMETRY_WORKERS", str(min(32, os.cpu_count() or 1))))
+GEOMETRY_MIN_PIXELS = 512 * 512
+_geometry_pool = None
+_geometry_pool_lock = threading.Lock()
+_geometry_worker = threading.local()
+
+def set_geometry_workers(count):
+    """Sets the number of geometry worker threads, replacing the current pool; 1 runs everything serially."""
+    global GEOMETRY_WORKERS, _geometry_pool
+    with _geometry_pool_lock:
+        GEOMETRY_WORKERS = count
+        if _geometry_pool is not None:
+            _geometry_pool.shutdown(wait=True)
+            _geometry_pool = None
+
+def _init_geometry_worker():
+    _geometry_worker.active = True
+
+def map_items(fn, count, pixels_per_item):
+    """
+    Returns [fn(0), ..., fn(count - 1)], run on the shared geometry pool when the batch is large enough.
+    Results are always in item order.  Calls made from inside a pool worker run serially so nested batches
+    can never wait on their own pool.
+    """
+    if (GEOMETRY_WORKERS <= 1 or count < 2 or count * pixels_per_item < GEOMETRY_MIN_PIXELS
+            or getattr(_geometry_worker, "active", False)):
+        return [fn(i) for i in range(count)]
+    global _geometry_pool
+    with _geometry_pool_lock:
+        if _geometry_pool is None:
+            from concurrent.futures import ThreadPoolExecutor
+            _geometry_pool = ThreadPoolExecutor(max_workers=GEOMETRY_WORKERS, thread_name_prefix="wc-geometry", initializer=_init_geometry_worker)
+        pool = _geometry_pool
+    return list(pool.map(fn, range(count)))
+
+# Opt-in on-disk cache of mask geometry (component tables, hull vertices, per-frame extents), so analysing
+# the same mask again, even after a restart, skips the work.  Enabled by setting WC_GEOMETRY_CACHE_DIR (or
+# set_geometry_cache()).  Every entry is one small .npy file named by a hash of the binary mask and the kind
+# of analysis, read back memory-mapped.  Entries are evicted least recently used first (hits refresh the
+# file's modification time) once they exceed WC_GEOMETRY_CACHE_MB in total.
+GEOMETRY_CACHE_DIR = os.environ.get("WC_GEOMETRY_CACHE_DIR", "")
+GEOMETRY_CACHE_BYTES = int(float(os.environ.get("WC_GEOMETRY_CACHE_MB", "64")) * 1024 * 1024)
+# Bumped whenever the layout of a cached array changes, which invalidates all existing entries
+_GEOMETRY_CACHE_VERSION = 1
+
+class GeometryCache:
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # Total size of the entries, scanned from the directory on the first store
+        self._bytes = None
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self):
+        return bool(self.directory) and self.max_bytes > 0
+
+    @staticmethod
+    def key(kind, binary, **params):
+        """Returns the key of the analysis 'kind' (with parameters) of a boolean mask array."""
+        digest = hashlib.blake2b(digest_size=20)
+        digest.update(repr((_GEOMETRY_CACHE_VERSION, kind, binary.shape, sorted(params.items()))).encode())
+        digest.update(np.packbits(binary).tobytes())
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + ".npy")
+
+    def get(self, key):
+        """Returns the cached array (memory-mapped, read-only) for a key, or None."""
+        path = self._path(key)
+        try:
+            array = np.load(path, mmap_mode="r")
+            os.utime(path)
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return array
+
+    def put(self, key, array):
+        """Stores an array under a key, then evicts the least recently used entries beyond the size limit."""
+        os.makedirs(self.directory, exist_ok=True)
+        temp_path = f"{self._path(key)}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(temp_path, "wb") as file:
+                np.save(file, np.ascontiguousarray(array))
+            size = os.path.getsize(temp_path)
+            # An existing entry for the key is overwritten, only the difference is added to the total
+            try:
+                replaced = os.path.getsize(self._path(key))
+            except OSError:
+                replaced = 0
+            os.replace(temp_path, self._path(key))
+        except OSError as e:
+            logging.debug(f"WC geometry cache could not store {key}: {e}")
+            return
+        with self._lock:
+            if self._bytes is None:
+                self._bytes = self._scan()
+            else:
+                self._bytes += size - replaced
+            if self._bytes > self.max_bytes:
+                self._evict()
+
+    def _entries(self):
+        return [entry for entry in os.scandir(self.directory) if entry.name.endswith(".npy")]
+
+    def _scan(self):
+        return sum(entry.stat().st_size for entry in self._entries())
+
+    def _evict(self):
+        # Rescan, other processes may share the directory
+        entries = sorted(self._entries(), key=lambda entry: entry.stat().st_mtime)
+        self._bytes = sum(entry.stat().st_size for entry in entries)
+        for entry in entries:
+            if self._bytes <= self.max_bytes:
+                break
+            try:
+                size = entry.stat().st_size
+                os.remove(entry.path)
+                self._bytes -= size
+            except OSError:
+                # Removed by another process, or still mapped on Windows
+                pass
+
+    def trim(self):
+        """Rescans the directory and evicts entries beyond the size limit."""
+        with self._lock:
+            self._bytes = None
+            if self.enabled and os.path.isdir(self.directory):
+                self._evict()
+
+    def cached(self, kind, binary, compute, **params):
+        """Returns compute() for the analysis 'kind' of a boolean mask array, through the cache when enabled."""
+        if not self.enabled:
+            return compute()
+        key = self.key(kind, binary, **params)
+        array = self.get(key)
+        if array is None:
+            array = compute()
+            self.put(key, array)
+        return array
+
+    def clear(self):
+        with self._lock:
+            if self.directory and os.path.isdir(self.directory):
+                for entry in self._entries():
+                    try:
+                        os.remove(entry.path)
+                    except OSError:
+                        pass
+            self._bytes = None
+
+    def stats(self):
+        with self._lock:
+            requests = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / requests if requests else 0.0,
+                "bytes_stored": self._scan() if self.enabled and os.path.isdir(self.directory) else 0,
+            }
+
+_geometry_cache = GeometryCache(GEOMETRY_CACHE_DIR, GEOMETRY_CACHE_BYTES)
+
+def set_geometry_cache(directory, megabytes=None):
+    """Sets the geometry cache directory ("" disables it) and optionally its size limit in MB."""
+    global GEOMETRY_CACHE_DIR, GEOMETRY_CACHE_BYTES
+    GEOMETRY_CACHE_DIR = directory
+    _geometry_cache.directory = directory
+    if megabytes is not None:
+        GEOMETRY_CACHE_BYTES = int(megabytes * 1024 * 1024)
+        _geometry_cache.max_bytes = GEOMETRY_CACHE_BYTES
+    _geometry_cache.trim()
+
+def geometry_cache_stats():
+    """Returns the geometry cache's hits, misses, hit_rate and bytes_stored."""
+    return _geometry_cache.stats()
+
+def mask_occupancy(mask, predicate=torch.ne, bytes_per_pixel=1):
+    """
+    Returns (cols, rows) boolean occupancy vectors of a 2D mask, where predicate(mask, 0) holds.
+    Evaluated in row bands so the full-frame boolean temporary never exceeds the memory budget, the band
+    temporary comes from the buffer pool.  predicate is a comparison taking an 'out' tensor (torch.ne, torch.gt).
+    """
+    height, width = mask.shape
+    cols = torch.zeros((width,), dtype=torch.bool, device=mask.device)
+    rows = torch.zeros((height,), dtype=torch.bool, device=mask.device)
+    for y0, y1 in row_bands(height, width, bytes_per_pixel):
+        active = pooled_empty((y1 - y0, width), torch.bool, mask.device)
+        predicate(mask[y0:y1], 0, out=active)
+        cols |= torch.any(active, dim=0)
+        rows[y0:y1] = torch.any(active, dim=1)
+        release_buffer(active)
+    return cols, rows
+
+def bounding_circle(mask):
+    """
+    Returns (center_x, center_y, radius) of the circle centered on the centroid of the non-zero pixels of a 2D
+    mask that contains all of them, or None if the mask is empty.  Only per-row and per-column pixel counts and
+    the first and last pixel of each row are gathered, in row bands within the memory budget: the pixel of a
+    row farthest from any point is always one of its ends.
+    """
+    height, width = mask.shape
+    device = mask.device
+    row_counts = torch.zeros((height,), dtype=torch.int64, device=device)
+    col_counts = torch.zeros((width,), dtype=torch.int64, device=device)
+    left = torch.zeros((height,), dtype=torch.int64, device=device)
+    right = torch.zeros((height,), dtype=torch.int64, device=device)
+    # The bool band plus its flipped uint8 copy
+    for y0, y1 in row_bands(height, width, 2):
+        active = pooled_empty((y1 - y0, width), torch.bool, device)
+        torch.ne(mask[y0:y1], 0, out=active)
+        row_counts[y0:y1] = active.sum(dim=1)
+        col_counts += active.sum(dim=0)
+        band = active.view(torch.uint8)
+        left[y0:y1] = band.argmax(dim=1)
+        right[y0:y1] = width - 1 - band.flip(1).argmax(dim=1)
+        release_buffer(active)
+    count = row_counts.sum().item()
+    if count == 0:
+        return None
+    ys = torch.arange(height, dtype=torch.float64, device=device)
+    xs = torch.arange(width, dtype=torch.float64, device=device)
+    center_y = _scalar((row_counts * ys).sum().item() / count, device)
+    center_x = _scalar((col_counts * xs).sum().item() / count, device)
+    # Distances in float32 exactly as _circle_kernel computes them, so the farthest pixel is never rounded out
+    occupied = row_counts > 0
+    dy = (ys[occupied].float() - center_y) ** 2
+    reach = torch.maximum((left[occupied].float() - center_x) ** 2, (right[occupied].float() - center_x) ** 2)
+    radius = torch.sqrt(reach + dy).max()
+    return center_x, center_y, radius
+
+def occupancy_extent(occupancy):
+    """Returns the (first, last) index set in a boolean occupancy vector, or None if it is empty."""
+    indices = torch.nonzero(occupancy, as_tuple=False)
+    if len(indices) == 0:
+        return None
+    return indices[0, 0].item(), indices[-1, 0].item()
+
+# Opt-in torch.compile backend for the per-pixel kernels of the composite, overlay and shape nodes, which
+# otherwise run as chains of eager ops that each make their own full-frame pass.  Enable with the
+# WC_COMPILE_KERNELS=1 environment variable or set_compiled_kernels(True).  Compiled graphs are cached per
+# bucket of (kernel, device, dtype, rank) and compiled with dynamic shapes, so a new resolution does not
+# trigger a recompile.  Calls smaller than COMPILE_MIN_PIXELS, or whose compilation fails, run eagerly.
+COMPILE_KERNELS = os.environ.get("WC_COMPILE_KERNELS", "0") == "1"
+COMPILE_MIN_PIXELS = 256 * 256
+_compiled_kernels = {}
+
+def set_compiled_kernels(enabled):
+    """Enables or disables the compiled kernel backend."""
+    global COMPILE_KERNELS
+    COMPILE_KERNELS = enabled
+
+def run_kernel(kernel, pixels, *args, out):
+    """
+    Runs a per-pixel kernel into 'out', through its compiled graph when the compiled backend is enabled.
+    In eager mode the kernel's in-place variant from _EAGER_KERNELS is used, which keeps its temporaries in
+    pooled scratch buffers instead of allocating new ones on every call.
+
+    Args:
+        kernel: Kernel function, all its tensor and scalar arguments must be tensors so compiled graphs are reused
+        pixels: Number of pixels the call processes, used to skip compilation for small calls
+        args: Kernel arguments, the first one determines the cache bucket
+        out: Tensor the result is written to, it may be one of the arguments
+
+    Returns:
+        out
+    """
+    if not COMPILE_KERNELS or pixels < COMPILE_MIN_PIXELS or not hasattr(torch, "compile"):
+        return _run_eager(kernel, out, args)
+    first = args[0]
+    key = (kernel.__name__, first.device.type, first.dtype, first.dim())
+    compiled = _compiled_kernels.get(key)
+    if compiled is None:
+        compiled = torch.compile(kernel, dynamic=True)
+        _compiled_kernels[key] = compiled
+    elif compiled is False:
+        return _run_eager(kernel, out, args)
+    try:
+        return out.copy_(compiled(*args))
+    except Exception as e:
+        # Never fail a node because of the optional backend, fall back to eager for this bucket from now on
+        logging.warning(f"WC mask kernel '{kernel.__name__}' could not be compiled, falling back to eager mode: {e}")
+        _compiled_kernels[key] = False
+        return _run_eager(kernel, out, args)
+
+def _run_eager(kernel, out, args):
+    into = _EAGER_KERNELS.get(kernel)
+    if into is None:
+        return out.copy_(kernel(*args))
+    into(out, *args)
+    return out
+
+def _scalar(value, device):
+    """Wraps a python number as a float32 scalar tensor, so compiled kernels don't specialize on its value."""
+    return torch.as_tensor(value, dtype=torch.float32, device=device)
+
+def _composite_max_kernel(destination, source):
+    return torch.fmax(destination, source)
+
+def _composite_min_kernel(destination, source):
+    return torch.fmin(destination, source)
+
+def _circle_kernel(y_coords, x_coords, center_x, center_y, scale, radius, value):
+    norm_x = (x_coords - center_x) / scale
+    norm_y = (y_coords - center_y) / scale
+    distances = torch.sqrt(norm_x ** 2 + norm_y ** 2)
+    return (distances <= radius).float() * value
+
+def _ellipse_kernel(y_coords, x_coords, center_x, center_y, scale, radius_x, radius_y, value):
+    norm_x = (x_coords - center_x) / scale
+    norm_y = (y_coords - center_y) / scale
+    ellipse_mask = ((norm_x / radius_x) ** 2 + (norm_y / radius_y) ** 2) <= 1.0
+    return ellipse_mask.float() * value
+
+def _blend_kernel(image, mask, color, keep, opacity):
+    # alpha = mask * (1 - opacity) + opacity where the mask is active (> 0), the raw mask value elsewhere
+    alpha = torch.where(mask > 0, mask * keep + opacity, mask).unsqueeze(-1)
+    return (1 - alpha) * image + alpha * color
+
+def _palette_blend_kernel(image, masks, colors, keep, opacity):
+    # Per-mask alpha as in _blend_kernel, combined so overlapping masks mix their colours by alpha and the
+    # total coverage is 1 - prod(1 - alpha); a single mask gives the same blend as _blend_kernel
+    alpha = torch.where(masks > 0, masks * keep + opacity, masks)
+    coverage = (1 - torch.prod(1 - alpha, dim=0)).unsqueeze(-1)
+    color = torch.einsum('nhw,nc->hwc', alpha, colors) / alpha.sum(dim=0).clamp(min=1e-6).unsqueeze(-1)
+    return (1 - coverage) * image + coverage * color
+
+# In-place eager versions of the kernels above.  They compute the same operations in the same order (so the
+# results are bit-identical) but keep every full-band temporary in a pooled scratch buffer.
+
+def _circle_into(out, y_coords, x_coords, center_x, center_y, scale, radius, value):
+    norm_x = (x_coords - center_x) / scale
+    norm_y = (y_coords - center_y) / scale
+    distances = pooled_empty(out.shape, torch.float32, out.device)
+    inside = pooled_empty(out.shape, torch.bool, out.device)
+    torch.add(norm_x ** 2, norm_y ** 2, out=distances).sqrt_()
+    torch.le(distances, radius, out=inside)
+    out.copy_(inside).mul_(value)
+    release_buffer(distances)
+    release_buffer(inside)
+
+def _ellipse_into(out, y_coords, x_coords, center_x, center_y, scale, radius_x, radius_y, value):
+    norm_x = (x_coords - center_x) / scale
+    norm_y = (y_coords - center_y) / scale
+    total = pooled_empty(out.shape, torch.float32, out.device)
+    inside = pooled_empty(out.shape, torch.bool, out.device)
+    torch.add((norm_x / radius_x) ** 2, (norm_y / radius_y) ** 2, out=total)
+    torch.le(total, 1.0, out=inside)
+    out.copy_(inside).mul_(value)
+    release_buffer(total)
+    release_buffer(inside)
+
+def _blend_into(out, image, mask, color, keep, opacity):
+    alpha = pooled_empty(mask.shape, mask.dtype, mask.device)
+    active = pooled_empty(mask.shape, torch.bool, mask.device)
+    blended = pooled_empty(image.shape, image.dtype, image.device)
+    torch.mul(mask, keep, out=alpha).add_(opacity)
+    torch.gt(mask, 0, out=active)
+    torch.where(active, alpha, mask, out=alpha)
+    torch.mul(alpha.unsqueeze(-1), color, out=blended)
+    # 1 - alpha
+    alpha.neg_().add_(1)
+    torch.mul(image, alpha.unsqueeze(-1), out=out).add_(blended)
+    release_buffer(alpha)
+    release_buffer(active)
+    release_buffer(blended)
+
+def _palette_blend_into(out, image, masks, colors, keep, opacity):
+    alpha = pooled_empty(masks.shape, masks.dtype, masks.device)
+    scratch = pooled_empty(masks.shape, masks.dtype, masks.device)
+    active = pooled_empty(masks.shape, torch.bool, masks.device)
+    coverage = pooled_empty(masks.shape[1:], masks.dtype, masks.device)
+    total = pooled_empty(masks.shape[1:], masks.dtype, masks.device)
+    torch.mul(masks, keep, out=alpha).add_(opacity)
+    torch.gt(masks, 0, out=active)
+    torch.where(active, alpha, masks, out=alpha)
+    torch.prod(torch.neg(alpha, out=scratch).add_(1), dim=0, out=coverage)
+    coverage.neg_().add_(1)
+    color = torch.einsum('nhw,nc->hwc', alpha, colors)
+    color /= torch.sum(alpha, dim=0, out=total).clamp_(min=1e-6).unsqueeze(-1)
+    color *= coverage.unsqueeze(-1)
+    # 1 - coverage
+    coverage.neg_().add_(1)
+    torch.mul(image, coverage.unsqueeze(-1), out=out).add_(color)
+    for buffer in (alpha, scratch, active, coverage, total):
+        release_buffer(buffer)
+
+def _pixel_coords(y0, y1, width, device):
+    """Column vector of row coordinates [y1-y0, 1] and row vector of column coordinates [1, width]."""
+    y_coords = torch.arange(y0, y1, dtype=torch.float32, device=device).unsqueeze(1)
+    x_coords = torch.arange(width, dtype=torch.float32, device=device).unsqueeze(0)
+    return y_coords, x_coords
+
+def _fill_circle(output, center_x, center_y, scale, radius, value=1.0):
+    """
+    Rasterizes a circle into a 2D output tensor, pixels with sqrt(((x-cx)/scale)² + ((y-cy)/scale)²) <= radius
+    get value, everything else is set to 0.
+    """
+    height, width = output.shape
+    device = output.device
+    args = [_scalar(v, device) for v in (center_x, center_y, scale, radius, value)]
+    for y0, y1 in row_bands(height, width, 16):
+        y_coords, x_coords = _pixel_coords(y0, y1, width, device)
+        run_kernel(_circle_kernel, (y1 - y0) * width, y_coords, x_coords, *args, out=output[y0:y1])
+    return output
+
+def _fill_ellipse(output, center_x, center_y, scale, radius_x, radius_y, value=1.0):
+    """
+    Rasterizes an ellipse into a 2D output tensor, pixels with ((x-cx)/scale/rx)² + ((y-cy)/scale/ry)² <= 1
+    get value, everything else is set to 0.
+    """
+    height, width = output.shape
+    device = output.device
+    args = [_scalar(v, device) for v in (center_x, center_y, scale, radius_x, radius_y, value)]
+    for y0, y1 in row_bands(height, width, 16):
+        y_coords, x_coords = _pixel_coords(y0, y1, width, device)
+        run_kernel(_ellipse_kernel, (y1 - y0) * width, y_coords, x_coords, *args, out=output[y0:y1])
+    return output
+
 class WCCompositeMask:
     @classmethod
     def INPUT_TYPES(s):
         return {
             "required": {
-                "mask_a": ("MASK",),
-                "mask_b": ("MASK",),
+                "mask_a": ("MASK", {"lazy": True}),
+                "mask_b": ("MASK", {"lazy": True, "tooltip": "Skipped when 'same_size' is set and mask_a already decides the result (an empty mask_a for min, a full mask_a for max)."}),
                 "op": (["max", "min"],),
+            },
+            "optional": {
+                "same_size": ("BOOLEAN", {"default": False, "tooltip": "Set when mask_a and mask_b are known to have the same size and batch (e.g. both derived from the same image). Only then can mask_b be skipped, since the result otherwise takes mask_b's size and keeps its values outside mask_a."}),
             }
         }
 
     CATEGORY = "WC/masks"
     RETURN_TYPES = ("MASK",)
     FUNCTION = "combine"
-    DESCRIPTION = "Combines two masks using the specified operator."
+    DESCRIPTION = "Combines two masks using the specified operator. The result has mask_b's size. mask_a is evaluated first, and with 'same_size' set mask_b is skipped entirely when it cannot change the result."
 
-    def combine(self, mask_a, mask_b, op):
+    def check_lazy_status(self, mask_a, mask_b, op, same_size=False):
+        if mask_a is None:
+            return ["mask_a"]
+        if mask_b is None and not (same_size and self._decided_by(mask_a, op)):
+            return ["mask_b"]
+        return []
+
+    def _decided_by(self, mask_a, op):
+        """True if mask_a alone determines the result: min with an empty mask, or max with a full one."""
+        if op == "min":
+            return not mask_a.max() > 0
+        return op == "max" and bool(mask_a.min() >= 1)
+
+    def combine(self, mask_a, mask_b, op, same_size=False):
+        if mask_b is None:
+            # Skipped by check_lazy_status, mask_b has mask_a's size so mask_a is the result (all zeros or all ones)
+            return (mask_a.reshape((-1, mask_a.shape[-2], mask_a.shape[-1])).clone(),)
         output = mask_b.reshape((-1, mask_b.shape[-2], mask_b.shape[-1])).clone()
         source = mask_a.reshape((-1, mask_a.shape[-2], mask_a.shape[-1]))
     
@@ -28,11 +609,12 @@ class WCCompositeMask:
     
         source_portion = source[:, :visible_height, :visible_width]
         destination_portion = output[:, top:bottom, left:right]
+        pixels = destination_portion.numel()
     
         if op == "max":
-            output[:, top:bottom, left:right] = torch.fmax(destination_portion, source_portion)
+            run_kernel(_composite_max_kernel, pixels, destination_portion, source_portion, out=destination_portion)
         elif op == "min":
-            output[:, top:bottom, left:right] = torch.fmin(destination_portion, source_portion)
+            run_kernel(_composite_min_kernel, pixels, destination_portion, source_portion, out=destination_portion)
     
         return (output,)
 
@@ -49,46 +631,432 @@ class WCMaskBounds:
                 "aspect_x": ("INT", {"default": 0, "min": 0, "max": 4096, "tooltip": "An X width value, used to indicate a target aspect ratio. 0 to allow any aspect."}),
                 "aspect_y": ("INT", {"default": 0, "min": 0, "max": 4096, "tooltip": "A Y height value, used to indicate a target aspect ratio. 0 to allow any aspect."}),
                 "dynamic": ("BOOLEAN", {"default": False, "tooltip": "If true, the aspect_x/y are only used to indicate overall minimum target pixel count the actual resolution will be chosen intelligently based upon mask size."}),
+                "temporal": ("BOOLEAN", {"default": False, "tooltip": "If true, the mask batch is treated as a frame sequence: every frame is analysed (only re-examining changed rows and columns) and the bounds cover all frames."}),
+                "smoothing": ("FLOAT", {"default": 0.5, "min": 0.0, "max": 0.99, "step": 0.01, "tooltip": "Temporal mode only. How strongly each frame's box in 'frame_bounds' follows the previous frame's box (0 = no smoothing). The x/y/width/height outputs cover all frames and do not change with it."}),
+                "integral": ("WC_MASK_INTEGRAL", {"tooltip": "Optional summed-area table of the same mask (from WCMaskIntegral), used instead of scanning the mask."}),
+                "plan": ("BOOLEAN", {"default": False, "tooltip": "If true, the crop and its target resolution are planned together to sample as few pixels as possible while keeping 'min_detail' pixels on the masked area. The aspect inputs are ignored."}),
+                "latent_multiple": ("INT", {"default": 8, "min": 8, "max": 128, "step": 8, "tooltip": "The target width and height are snapped up to a multiple of this (8 for the latent grid, 64 for models that need it)."}),
+                "min_detail": ("INT", {"default": 262144, "min": 4096, "max": 16777216, "step": 4096, "tooltip": "Plan mode only. Minimum number of sampled pixels covering the masked area itself (before grow)."}),
+                "max_pixels": ("INT", {"default": 1048576, "min": 4096, "max": 16777216, "step": 4096, "tooltip": "Plan mode only. Maximum number of sampled pixels for the whole crop (before snapping), usually the model's standard resolution. Tiny masks get less than 'min_detail' rather than a huge upscale."}),
             }
         }
 
     CATEGORY = "WC/masks"
-    RETURN_TYPES = ("INT", "INT", "INT", "INT")
-    RETURN_NAMES = ("x", "y", "width", "height")
+    RETURN_TYPES = ("INT", "INT", "INT", "INT", "WC_BOUNDS", "INT", "INT", "INT")
+    RETURN_NAMES = ("x", "y", "width", "height", "frame_bounds", "target_width", "target_height", "pixels")
     FUNCTION = "get_bounds"
-    DESCRIPTION = "Returns the bounding box of the mask (as pixel coordinates x,y,width,height), optionally grown by the number of pixels specified in 'grow' and then optionally adjusted for aspect ratio."
+    DESCRIPTION = "Returns the bounding box of the mask (as pixel coordinates x,y,width,height), optionally grown by the number of pixels specified in 'grow' and then optionally adjusted for aspect ratio. In temporal mode every frame of the batch is analysed and the returned box covers all of them, while 'frame_bounds' holds the smoothed per-frame boxes for WCCropToFrameBounds. The target resolution to sample the crop at (snapped to 'latent_multiple') and its pixel count are returned too; in plan mode they are chosen to minimise sampling cost at the requested detail level."
 
-    def get_bounds(self, mask, grow, aspect_x=0, aspect_y=0, dynamic=False):
-        if len(mask.shape) == 3:
-            mask = mask[0]
-        sum_x = (torch.sum(mask, dim=0) != 0).to(dtype=torch.int)
-        sum_y = (torch.sum(mask, dim=1) != 0).to(dtype=torch.int)
-        def getval(arr, direction):
-            val = torch.argmax(arr).item()
-            val += grow * direction
-            val = max(0, min(val, arr.shape[0] - 1))
-            return val
-        x_start = getval(sum_x, -1)
-        x_end = mask.shape[1] - getval(sum_x.flip(0), -1)
-        y_start = getval(sum_y, -1)
-        y_end = mask.shape[0] - getval(sum_y.flip(0), -1)
-        if aspect_x > 0 and aspect_y > 0:
-            input_aspect = aspect_x / aspect_y
-            width = x_end - x_start
-            height = y_end - y_start
-            actual_aspect = width / height
-            if dynamic:
-                allowed_aspect_ratios = [1, 4/3, 3/2, 8/5, 16/9, 21/9, 3/4, 2/3, 5/8, 9/16, 9/21, input_aspect]
-                input_aspect = min(allowed_aspect_ratios, key=lambda x: abs(x - actual_aspect))
-            if actual_aspect > input_aspect:
-                desired_height = width / input_aspect
-                y_start = max(0, y_start - (desired_height - height) / 2)
-                y_end = min(mask.shape[0], y_start + desired_height)
+    def get_bounds(self, mask, grow, aspect_x=0, aspect_y=0, dynamic=False, temporal=False, smoothing=0.5, integral=None, plan=False, latent_multiple=8, min_detail=262144, max_pixels=1048576):
+        mask_height, mask_width = mask.shape[-2], mask.shape[-1]
+        if temporal and len(mask.shape) == 3:
+            frame_bounds = temporal_mask_bounds(mask, grow, aspect_x, aspect_y, dynamic, smoothing)
+            x = min(b[0] for b in frame_bounds)
+            y = min(b[1] for b in frame_bounds)
+            x_end = max(b[0] + b[2] for b in frame_bounds)
+            y_end = max(b[1] + b[3] for b in frame_bounds)
+            if plan:
+                # The envelope is already grown, plan on it directly
+                planned = plan_crop((x, x_end - 1), (y, y_end - 1), mask_width, mask_height, 0, latent_multiple, min_detail, max_pixels)
+                return planned[:4] + (frame_bounds,) + planned[4:]
+            return (x, y, x_end - x, y_end - y, frame_bounds) + snap_target(x_end - x, y_end - y, latent_multiple)
+        if integral is not None:
+            cols, rows = integral.col_occupancy(0), integral.row_occupancy(0)
+        else:
+            if len(mask.shape) == 3:
+                mask = mask[0]
+            cols = torch.sum(mask, dim=0) != 0
+            rows = torch.sum(mask, dim=1) != 0
+        if plan:
+            x_extent = occupancy_extent(cols) or (0, mask_width - 1)
+            y_extent = occupancy_extent(rows) or (0, mask_height - 1)
+            planned = plan_crop(x_extent, y_extent, mask_width, mask_height, grow, latent_multiple, min_detail, max_pixels)
+            return planned[:4] + ([planned[:4]],) + planned[4:]
+        bounds = bounds_from_occupancy(cols, rows, grow, aspect_x, aspect_y, dynamic)
+        return bounds + ([bounds],) + snap_target(bounds[2], bounds[3], latent_multiple)
+
+
+def snap_target(width, height, multiple):
+    """
+    Snaps a sampling resolution up to a multiple of 'multiple'.
+
+    Returns:
+        Tuple of ints (target_width, target_height, pixels)
+    """
+    target_width = max(multiple, math.ceil(width / multiple) * multiple)
+    target_height = max(multiple, math.ceil(height / multiple) * multiple)
+    return (target_width, target_height, target_width * target_height)
+
+
+def plan_crop(x_extent, y_extent, mask_width, mask_height, grow, multiple=8, min_detail=262144, max_pixels=1048576):
+    """
+    Plans a crop rectangle together with the resolution to sample it at.
+
+    The masked area (x_extent, y_extent) must be sampled with at least 'min_detail' pixels, which fixes the
+    minimum scale.  Any larger scale only grows the snapped target, so the cheapest plan is the minimum scale
+    with the grown box snapped up to 'multiple'.  The scale is capped so the grown box is sampled with at most
+    'max_pixels' pixels before snapping, which keeps tiny masks from being upscaled to huge targets.  The crop
+    is then widened around the box to the target's aspect, so the sampler's rescale does not distort it.
+
+    Args:
+        x_extent, y_extent: (first, last) masked column and row
+        mask_width, mask_height: Size of the mask
+        grow: Number of pixels to grow the box by
+        multiple: Latent multiple the target width and height are snapped to
+        min_detail: Minimum number of sampled pixels covering the masked area
+        max_pixels: Maximum number of sampled pixels covering the grown box, takes precedence over min_detail
+
+    Returns:
+        Tuple of ints (x, y, width, height, target_width, target_height, pixels)
+    """
+    feature_width = x_extent[1] - x_extent[0] + 1
+    feature_height = y_extent[1] - y_extent[0] + 1
+    x, y, width, height = bounds_from_extent(x_extent, y_extent, mask_width, mask_height, grow)
+    scale = min(math.sqrt(min_detail / (feature_width * feature_height)), math.sqrt(max_pixels / (width * height)))
+    target_width, target_height, pixels = snap_target(width * scale, height * scale, multiple)
+
+    def widen(start, size, target, limit):
+        desired = min(limit, max(size, math.floor(target / scale)))
+        start = max(0, min(start - (desired - size) // 2, limit - desired))
+        return start, desired
+    x, width = widen(x, width, target_width, mask_width)
+    y, height = widen(y, height, target_height, mask_height)
+    return (x, y, width, height, target_width, target_height, pixels)
+
+
+def bounds_from_occupancy(cols, rows, grow, aspect_x=0, aspect_y=0, dynamic=False):
+    """
+    Computes the (x, y, width, height) bounds of a mask from its column and row occupancy.
+
+    Args:
+        cols: Boolean tensor [W], true where the column contains any masked pixel
+        rows: Boolean tensor [H], true where the row contains any masked pixel
+        grow: Number of pixels to grow the bounds by
+        aspect_x, aspect_y: Optional target aspect ratio (0 to allow any aspect)
+        dynamic: If true, picks the closest standard aspect ratio to the mask's own aspect
+
+    Returns:
+        Tuple of ints (x, y, width, height)
+    """
+    mask_width, mask_height = cols.shape[0], rows.shape[0]
+    # An empty mask covers the whole frame
+    x_extent = occupancy_extent(cols) or (0, mask_width - 1)
+    y_extent = occupancy_extent(rows) or (0, mask_height - 1)
+    return bounds_from_extent(x_extent, y_extent, mask_width, mask_height, grow, aspect_x, aspect_y, dynamic)
+
+
+def bounds_from_extent(x_extent, y_extent, mask_width, mask_height, grow, aspect_x=0, aspect_y=0, dynamic=False):
+    """
+    Computes the (x, y, width, height) bounds from the (first, last) masked column and row,
+    grown and aspect-adjusted the same way as bounds_from_occupancy.
+    """
+    def getval(first, size):
+        return max(0, min(first - grow, size - 1))
+    x_start = getval(x_extent[0], mask_width)
+    x_end = mask_width - getval(mask_width - 1 - x_extent[1], mask_width)
+    y_start = getval(y_extent[0], mask_height)
+    y_end = mask_height - getval(mask_height - 1 - y_extent[1], mask_height)
+    if aspect_x > 0 and aspect_y > 0:
+        input_aspect = aspect_x / aspect_y
+        width = x_end - x_start
+        height = y_end - y_start
+        actual_aspect = width / height
+        if dynamic:
+            allowed_aspect_ratios = [1, 4/3, 3/2, 8/5, 16/9, 21/9, 3/4, 2/3, 5/8, 9/16, 9/21, input_aspect]
+            input_aspect = min(allowed_aspect_ratios, key=lambda x: abs(x - actual_aspect))
+        if actual_aspect > input_aspect:
+            desired_height = width / input_aspect
+            y_start = max(0, y_start - (desired_height - height) / 2)
+            y_end = min(mask_height, y_start + desired_height)
+        else:
+            desired_width = height * input_aspect
+            x_start = max(0, x_start - (desired_width - width) / 2)
+            x_end = min(mask_width, x_start + desired_width)
+    return (int(x_start), int(y_start), int(x_end - x_start), int(y_end - y_start))
+
+
+def frame_changes(previous, current):
+    """
+    Compares two frames of a sequence.
+
+    Returns:
+        (rows, cols) boolean occupancy of the changed pixels, or None if the frames are identical
+    """
+    changed = previous != current
+    cols = torch.any(changed, dim=0)
+    if not torch.any(cols):
+        return None
+    return torch.any(changed, dim=1), cols
+
+
+def temporal_mask_bounds(mask, grow, aspect_x=0, aspect_y=0, dynamic=False, smoothing=0.5):
+    """
+    Computes per-frame bounds of a mask sequence [B, H, W].
+    Row/column occupancy is carried from frame to frame and only recomputed for the rows and columns that
+    changed. The box edges are smoothed with an exponential moving average (weight 'smoothing' on the previous
+    frame) to avoid crop jitter, but each smoothed box is always widened to still contain its own frame's mask.
+
+    Returns:
+        List of (x, y, width, height) tuples, one per frame
+    """
+    mask_height, mask_width = mask.shape[-2:]
+    if _geometry_cache.enabled:
+        extents = _geometry_cache.cached("frame extents", (mask != 0).cpu().numpy(), lambda: frame_extents(mask))
+    else:
+        extents = frame_extents(mask)
+    smoothed = None
+    frame_bounds = []
+    for extent in extents.tolist():
+        if extent[0] >= 0:
+            raw = tuple(extent)
+            if smoothed is None:
+                smoothed = raw
             else:
-                desired_width = height * input_aspect
-                x_start = max(0, x_start - (desired_width - width) / 2)
-                x_end = min(mask.shape[1], x_start + desired_width)
-        return (int(x_start), int(y_start), int(x_end - x_start), int(y_end - y_start))
+                smoothed = tuple(smoothing * s + (1 - smoothing) * r for s, r in zip(smoothed, raw))
+            edges = (min(math.floor(smoothed[0]), raw[0]), max(math.ceil(smoothed[1]), raw[1]),
+                     min(math.floor(smoothed[2]), raw[2]), max(math.ceil(smoothed[3]), raw[3]))
+        elif smoothed is not None:
+            # Empty frame, hold the last smoothed box
+            edges = (math.floor(smoothed[0]), math.ceil(smoothed[1]), math.floor(smoothed[2]), math.ceil(smoothed[3]))
+        else:
+            # Nothing seen yet, an empty mask covers the whole frame
+            edges = (0, mask_width - 1, 0, mask_height - 1)
+        frame_bounds.append(bounds_from_extent(edges[0:2], edges[2:4], mask_width, mask_height, grow, aspect_x, aspect_y, dynamic))
+    return frame_bounds
+
+
+def frame_extents(mask):
+    """
+    Computes the extents of every frame of a mask sequence [B, H, W], carrying row/column occupancy from
+    frame to frame and only recomputing the rows and columns that changed.
+
+    Returns:
+        [B, 4] int64 array of (min_x, max_x, min_y, max_y) rows, all -1 for empty frames
+    """
+    cols, rows = mask_occupancy(mask[0])
+    extents = np.full((mask.shape[0], 4), -1, dtype=np.int64)
+    for f in range(mask.shape[0]):
+        if f > 0:
+            changes = frame_changes(mask[f - 1], mask[f])
+            if changes is not None:
+                changed_rows, changed_cols = changes
+                rows[changed_rows] = torch.any(mask[f][changed_rows] != 0, dim=1)
+                cols[changed_cols] = torch.any(mask[f][:, changed_cols] != 0, dim=0)
+        x_extent = occupancy_extent(cols)
+        if x_extent is not None:
+            extents[f] = x_extent + occupancy_extent(rows)
+    return extents
+
+
+class MaskIntegral:
+    """
+    Summed-area table of the occupancy (pixels > 0) of a mask batch.  Built with one pass over the mask,
+    after which emptiness, area and the coverage of any rectangle are O(1) lookups and the row/column
+    occupancy needed for bounds is O(H+W).
+    """
+    def __init__(self, mask):
+        mask = mask.reshape((-1, mask.shape[-2], mask.shape[-1]))
+        batch_size, self.height, self.width = mask.shape
+        dtype = torch.int32 if self.height * self.width < 2 ** 31 else torch.int64
+        self.table = torch.zeros((batch_size, self.height + 1, self.width + 1), dtype=dtype, device=mask.device)
+        torch.cumsum(torch.cumsum(mask > 0, dim=1, dtype=dtype), dim=2, out=self.table[:, 1:, 1:])
+
+    @property
+    def batch_size(self):
+        return self.table.shape[0]
+
+    def area(self, b=None):
+        """Number of occupied pixels of batch item b, or of the whole batch if b is None."""
+        if b is None:
+            return int(self.table[:, -1, -1].sum().item())
+        return int(self.table[b, -1, -1].item())
+
+    def is_empty(self, b=None):
+        return self.area(b) == 0
+
+    def rect_area(self, b, x0, y0, x1, y1):
+        """Number of occupied pixels in the rectangle [x0, x1) x [y0, y1) of batch item b."""
+        t = self.table[b]
+        return int((t[y1, x1] - t[y0, x1] - t[y1, x0] + t[y0, x0]).item())
+
+    def coverage(self, b, x0, y0, x1, y1):
+        """Fraction of the rectangle [x0, x1) x [y0, y1) of batch item b that is occupied."""
+        pixels = (x1 - x0) * (y1 - y0)
+        return self.rect_area(b, x0, y0, x1, y1) / pixels if pixels > 0 else 0.0
+
+    def row_occupancy(self, b):
+        """Boolean tensor [H], true where the row of batch item b contains an occupied pixel."""
+        last_col = self.table[b, :, -1]
+        return (last_col[1:] - last_col[:-1]) > 0
+
+    def col_occupancy(self, b):
+        """Boolean tensor [W], true where the column of batch item b contains an occupied pixel."""
+        last_row = self.table[b, -1, :]
+        return (last_row[1:] - last_row[:-1]) > 0
+
+
+class WCMaskIntegral:
+    """
+    Computes a summed-area table of a mask once, so nodes that accept an optional 'integral' input
+    (WCMaskBounds, WCSkipIfMaskEmpty, WCSeparateMaskComponents, WCBoundingBoxMask) can answer their
+    emptiness/area/bounds queries without another full-frame reduction.
+    """
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "mask": ("MASK",),
+            }
+        }
+
+    RETURN_TYPES = ("WC_MASK_INTEGRAL",)
+    RETURN_NAMES = ("integral",)
+    FUNCTION = "create_integral"
+    CATEGORY = "WC/masks"
+    DESCRIPTION = "Computes a summed-area table of the mask. Connect it to the 'integral' input of other WC mask nodes fed by the same mask to make their emptiness, area and bounds checks constant time."
+
+    def create_integral(self, mask):
+        return (MaskIntegral(mask),)
+
+
+class WCCropToMask:
+    """
+    Thresholds a mask, finds its (grown, aspect-adjusted) bounds and crops both the image and the mask to them.
+    Replaces a SwarmMaskThreshold -> WCMaskBounds -> SwarmImageCrop + CropMask chain with a single node.
+    """
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "image": ("IMAGE",),
+                "mask": ("MASK",),
+                "grow": ("INT", {"default": 0, "min": 0, "max": 1024, "tooltip": "Number of pixels to grow the mask bounds by."}),
+                "threshold": ("FLOAT", {"default": 0.01, "min": 0.0, "max": 1.0, "step": 0.01, "tooltip": "Mask values below this are treated as empty (set to 0). 0 to disable thresholding."}),
+                "threshold_max": ("FLOAT", {"default": 1.0, "min": 0.0, "max": 1.0, "step": 0.01, "tooltip": "Mask values above this are set to 1 (full masking). 1 to disable."}),
+            },
+            "optional": {
+                "aspect_x": ("INT", {"default": 0, "min": 0, "max": 4096, "tooltip": "An X width value, used to indicate a target aspect ratio. 0 to allow any aspect."}),
+                "aspect_y": ("INT", {"default": 0, "min": 0, "max": 4096, "tooltip": "A Y height value, used to indicate a target aspect ratio. 0 to allow any aspect."}),
+                "dynamic": ("BOOLEAN", {"default": False, "tooltip": "If true, the aspect_x/y are only used to indicate overall minimum target pixel count the actual resolution will be chosen intelligently based upon mask size."}),
+            }
+        }
+
+    CATEGORY = "WC/masks"
+    RETURN_TYPES = ("INT", "INT", "INT", "INT", "IMAGE", "MASK")
+    RETURN_NAMES = ("x", "y", "width", "height", "image", "mask")
+    FUNCTION = "crop"
+    DESCRIPTION = "Thresholds the mask, computes its bounds like WCMaskBounds and returns the bounds along with the image and mask cropped to them. The bounds outputs come first so this node can be used anywhere a WCMaskBounds node is expected."
+
+    def crop(self, image, mask, grow, threshold, threshold_max, aspect_x=0, aspect_y=0, dynamic=False):
+        """
+        Crops the image and mask to the thresholded mask bounds.
+
+        Args:
+            image: Input image tensor [B, H, W, C]
+            mask: Input mask tensor [B, H, W] or [H, W]
+            grow: Number of pixels to grow the bounds by
+            threshold, threshold_max: Mask values below threshold become 0, values above threshold_max become 1
+            aspect_x, aspect_y, dynamic: Aspect ratio adjustment, same as WCMaskBounds
+
+        Returns:
+            The bounds (x, y, width, height), the cropped image and the cropped, thresholded mask
+        """
+        mask = mask.reshape((-1, mask.shape[-2], mask.shape[-1]))
+
+        # Occupancy of the thresholded mask, without materializing the thresholded mask itself
+        if threshold > 0:
+            occupied = mask[0] >= threshold
+        else:
+            occupied = mask[0] != 0
+        cols = torch.any(occupied, dim=0)
+        rows = torch.any(occupied, dim=1)
+        x, y, width, height = bounds_from_occupancy(cols, rows, grow, aspect_x, aspect_y, dynamic)
+
+        # Slicing produces views, only the (much smaller) cropped mask is copied when thresholding
+        cropped_image = image[:, y:y + height, x:x + width, :]
+        cropped_mask = mask[:, y:y + height, x:x + width]
+        if threshold > 0 or threshold_max < 1:
+            cropped_mask = torch.where(cropped_mask < threshold, 0.0, cropped_mask)
+            cropped_mask = torch.where(cropped_mask > threshold_max, 1.0, cropped_mask)
+
+        return (x, y, width, height, cropped_image, cropped_mask)
+
+
+class WCCroppedMask:
+    """
+    Passes a mask through unchanged.  SwarmUI expects the cropped mask of a detailer crop to be output 0 of its
+    node, while WCCropToMask has to keep the bounds first, so the detailer routes its mask output through this.
+    """
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "mask": ("MASK",),
+            }
+        }
+
+    CATEGORY = "WC/masks"
+    RETURN_TYPES = ("MASK",)
+    RETURN_NAMES = ("mask",)
+    FUNCTION = "passthrough"
+    DESCRIPTION = "Returns the mask unchanged, so the 'mask' output of a WCCropToMask node can be used where a node with the mask as its first output is expected."
+
+    def passthrough(self, mask):
+        return (mask,)
+
+
+class WCCropToFrameBounds:
+    """
+    Crops every frame of an image and mask batch to its own box from the 'frame_bounds' output of a temporal
+    WCMaskBounds, so the crop follows a moving subject with the smoothed (jitter-free) per-frame boxes.
+    """
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "image": ("IMAGE",),
+                "mask": ("MASK",),
+                "frame_bounds": ("WC_BOUNDS",),
+            },
+            "optional": {
+                "width": ("INT", {"default": 0, "min": 0, "max": 16384, "tooltip": "Width every frame's crop is resampled to, so the batch stays one size. 0 to use the widest box."}),
+                "height": ("INT", {"default": 0, "min": 0, "max": 16384, "tooltip": "Height every frame's crop is resampled to, so the batch stays one size. 0 to use the tallest box."}),
+            }
+        }
+
+    CATEGORY = "WC/masks"
+    RETURN_TYPES = ("IMAGE", "MASK")
+    RETURN_NAMES = ("image", "mask")
+    FUNCTION = "crop"
+    DESCRIPTION = "Crops each frame of the image and mask to its box from the 'frame_bounds' of a temporal WCMaskBounds node (frames past the last box use the last box), resampling every crop to the same size."
+
+    def crop(self, image, mask, frame_bounds, width=0, height=0):
+        """
+        Crops every frame to its own bounds.
+
+        Args:
+            image: Input image tensor [B, H, W, C]
+            mask: Input mask tensor [B, H, W] or [H, W], a single mask is used for every frame
+            frame_bounds: List of (x, y, width, height) tuples, one per frame
+            width, height: Size of the output crops, 0 for the largest box
+
+        Returns:
+            The cropped image and mask batches
+        """
+        mask = mask.reshape((-1, mask.shape[-2], mask.shape[-1]))
+        out_width = width if width > 0 else max(b[2] for b in frame_bounds)
+        out_height = height if height > 0 else max(b[3] for b in frame_bounds)
+        images, masks = [], []
+        for f in range(image.shape[0]):
+            x, y, box_width, box_height = frame_bounds[min(f, len(frame_bounds) - 1)]
+            frame_image = image[f:f + 1, y:y + box_height, x:x + box_width, :]
+            frame_mask = mask[min(f, mask.shape[0] - 1)][y:y + box_height, x:x + box_width].unsqueeze(0)
+            if (box_height, box_width) != (out_height, out_width):
+                frame_image = torch.nn.functional.interpolate(frame_image.movedim(-1, 1), size=(out_height, out_width), mode='bilinear', align_corners=False).movedim(1, -1)
+                frame_mask = torch.nn.functional.interpolate(frame_mask.unsqueeze(1), size=(out_height, out_width), mode='bilinear', align_corners=False).squeeze(1)
+            images.append(frame_image)
+            masks.append(frame_mask)
+        return (torch.cat(images), torch.cat(masks))
 
 
 class WCSkipIfMaskEmpty:
@@ -99,29 +1067,292 @@ class WCSkipIfMaskEmpty:
                 "mask": ("MASK",),
                 "image_if_empty": ("IMAGE",{"lazy": True}),
                 "image_if_not_empty": ("IMAGE",{"lazy": True}),
+            },
+            "optional": {
+                "integral": ("WC_MASK_INTEGRAL", {"tooltip": "Optional summed-area table of the same mask (from WCMaskIntegral), used instead of scanning the mask."}),
+                "min_area": ("INT", {"default": 0, "min": 0, "max": 16777216, "tooltip": "Masks with fewer non-zero pixels than this are treated as empty. 0 to only skip truly empty masks."}),
+                "min_coverage": ("FLOAT", {"default": 0.0, "min": 0.0, "max": 1.0, "step": 0.0001, "tooltip": "Masks covering less than this fraction of the frame are treated as empty. 0 to disable."}),
+                "threshold": ("FLOAT", {"default": 0.0, "min": 0.0, "max": 1.0, "step": 0.01, "tooltip": "Mask values below this do not count as masked pixels, like the threshold of WCCropToMask. 0 to count every non-zero pixel."}),
             }
         }
 
     CATEGORY = "WC/masks"
     RETURN_TYPES = ("IMAGE",)
     FUNCTION = "route"
-    DESCRIPTION = "If the mask is empty, returns the 'image_if_empty' image. Otherwise, returns the 'image_if_not_empty' image.  Only evaluates the input image that is going to be returned."
+    DESCRIPTION = "If the mask is empty (or has fewer than 'min_area' pixels / 'min_coverage' of the frame at or above 'threshold'), returns the 'image_if_empty' image. Otherwise, returns the 'image_if_not_empty' image.  Only evaluates the input image that is going to be returned."
 
-    def check_lazy_status(self, mask, image_if_empty, image_if_not_empty):
-        mask_max = mask.max()
-        if mask_max == 0 and image_if_empty is None:
+    def check_lazy_status(self, mask, image_if_empty, image_if_not_empty, integral=None, min_area=0, min_coverage=0.0, threshold=0.0):
+        is_empty = self._is_empty(mask, integral, min_area, min_coverage, threshold)
+        if is_empty and image_if_empty is None:
             return ["image_if_empty"]
-        elif mask_max > 0 and image_if_not_empty is None:
+        elif not is_empty and image_if_not_empty is None:
             return ["image_if_not_empty"]
         return []
     
-    def route(self, mask, image_if_empty, image_if_not_empty):
-        mask_max = mask.max()
-        if mask_max == 0:
+    def route(self, mask, image_if_empty, image_if_not_empty, integral=None, min_area=0, min_coverage=0.0, threshold=0.0):
+        if self._is_empty(mask, integral, min_area, min_coverage, threshold):
             return (image_if_empty,)
         else:
             return (image_if_not_empty,)
 
+    def _is_empty(self, mask, integral, min_area=0, min_coverage=0.0, threshold=0.0):
+        if threshold > 0:
+            # The integral counts every non-zero pixel, so it can't answer thresholded queries
+            integral = None
+        if min_area <= 1 and min_coverage <= 0:
+            if integral is not None:
+                return integral.is_empty()
+            return not (mask.max() >= threshold if threshold > 0 else mask.max() > 0)
+        masked = mask >= threshold if threshold > 0 else mask > 0
+        area = integral.area() if integral is not None else int(torch.count_nonzero(masked).item())
+        return area == 0 or area < min_area or area < min_coverage * mask.numel()
+
+
+def mask_stats(mask):
+    """
+    Computes the statistics of a 2D mask's non-zero pixels: one labelling pass for the component count and one
+    reduction per axis, from which the area, centroid and bounding box all follow.
+
+    Returns:
+        Dict with area, coverage, components, centroid_x, centroid_y and the bbox x, y, width, height
+        (all zero for an empty mask)
+    """
+    binary = mask.cpu().numpy() > 0
+    height, width = binary.shape
+    _, components = ndimage.label(binary, structure=CONNECTIVITY_8)
+    row_counts = binary.sum(axis=1, dtype=np.int64)
+    col_counts = binary.sum(axis=0, dtype=np.int64)
+    area = int(row_counts.sum())
+    stats = {"area": area, "coverage": area / (width * height) if width * height else 0.0, "components": int(components),
+             "centroid_x": 0.0, "centroid_y": 0.0, "x": 0, "y": 0, "width": 0, "height": 0}
+    if area == 0:
+        return stats
+    rows, cols = np.flatnonzero(row_counts), np.flatnonzero(col_counts)
+    stats.update({
+        "centroid_x": float(col_counts @ np.arange(width)) / area,
+        "centroid_y": float(row_counts @ np.arange(height)) / area,
+        "x": int(cols[0]),
+        "y": int(rows[0]),
+        "width": int(cols[-1] - cols[0] + 1),
+        "height": int(rows[-1] - rows[0] + 1),
+    })
+    return stats
+
+
+class WCMaskStats:
+    """
+    Computes area, coverage, component count, centroid and bounding box of a mask in one node, e.g. to gate
+    or budget the detailing of a segment.
+    """
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "mask": ("MASK",),
+            }
+        }
+
+    RETURN_TYPES = ("INT", "FLOAT", "INT", "FLOAT", "FLOAT", "INT", "INT", "INT", "INT")
+    RETURN_NAMES = ("area", "coverage", "components", "centroid_x", "centroid_y", "x", "y", "width", "height")
+    FUNCTION = "get_stats"
+    CATEGORY = "WC/masks"
+    DESCRIPTION = "Returns the number of non-zero pixels, the fraction of the frame they cover, the number of 8-connected components, their centroid and their bounding box (x, y, width, height) of the (first) mask."
+
+    def get_stats(self, mask):
+        if len(mask.shape) == 3:
+            mask = mask[0]
+        stats = mask_stats(mask)
+        return tuple(stats[name] for name in self.RETURN_NAMES)
+
+
+# 8-connectivity structure (includes diagonals) used for all component labelling
+CONNECTIVITY_8 = np.ones((3, 3), dtype=bool)
+
+
+def _describe_components(labels, count, origin=(0, 0), label_offset=0):
+    """
+    Computes bounding box, center and area of labelled components in a single pass over the label array.
+
+    Args:
+        labels: Label array as produced by ndimage.label (labels 1..count)
+        count: Number of labels
+        origin: (y, x) position of the label array within the full frame
+        label_offset: Added to every label to get the component's label in the full frame
+
+    Returns:
+        Dict of label -> component info, in label order
+    """
+    origin_y, origin_x = origin
+    areas = np.bincount(labels.ravel(), minlength=count + 1)
+    components = {}
+    for i, bbox in enumerate(ndimage.find_objects(labels, count), start=1):
+        if bbox is None:
+            continue
+        min_y, max_y = bbox[0].start + origin_y, bbox[0].stop - 1 + origin_y
+        min_x, max_x = bbox[1].start + origin_x, bbox[1].stop - 1 + origin_x
+        components[i + label_offset] = {
+            'label': i + label_offset,
+            'center_x': (min_x + max_x) / 2,
+            'center_y': (min_y + max_y) / 2,
+            'min_x': min_x,
+            'max_x': max_x,
+            'min_y': min_y,
+            'max_y': max_y,
+            'area': int(areas[i]),
+        }
+    return components
+
+
+def label_components(binary):
+    """
+    Finds the 8-connected components of a binary mask.
+
+    Returns:
+        (labels, components): the label array and a dict of label -> component info
+    """
+    labels, num_features = ndimage.label(binary, structure=CONNECTIVITY_8)
+    return labels, _describe_components(labels, num_features)
+
+
+# Columns of a component table in the geometry cache; the seed is the first pixel of the component's top row
+_COMPONENT_FIELDS = ('label', 'min_x', 'max_x', 'min_y', 'max_y', 'area', 'seed_x')
+
+def cached_label_components(binary):
+    """
+    Like label_components, but through the geometry cache.  The label array itself is not cached, so it is
+    None on a cache hit; component_pixels() finds a component's pixels either way.
+    """
+    labels = None
+
+    def compute():
+        nonlocal labels
+        labels, components = label_components(binary)
+        table = np.zeros((len(components), len(_COMPONENT_FIELDS)), dtype=np.int64)
+        for row, info in zip(table, components.values()):
+            top_row = labels[info['min_y'], info['min_x']:info['max_x'] + 1]
+            info['seed_x'] = info['min_x'] + int(np.argmax(top_row == info['label']))
+            row[:] = [info[field] for field in _COMPONENT_FIELDS]
+        return table
+
+    table = _geometry_cache.cached("components", binary, compute)
+    components = {}
+    for row in table.tolist():
+        info = dict(zip(_COMPONENT_FIELDS, row))
+        info['center_x'] = (info['min_x'] + info['max_x']) / 2
+        info['center_y'] = (info['min_y'] + info['max_y']) / 2
+        components[info['label']] = info
+    return labels, components
+
+
+def component_pixels(binary, labels, info):
+    """
+    Returns the bounding box slices of a component and a boolean array of its pixels within the box.
+    Without a label array, the box alone is labelled: the component lies entirely inside it, so it is the
+    box component containing its seed pixel.
+    """
+    box = _component_slices(info)
+    if labels is not None:
+        return box, labels[box] == info['label']
+    box_labels = ndimage.label(binary[box], structure=CONNECTIVITY_8)[0]
+    return box, box_labels == box_labels[0, info['seed_x'] - info['min_x']]
+
+
+def update_components(labels, components, binary, changed_rows, changed_cols, next_label):
+    """
+    Updates a labelling in place after some pixels of the binary mask changed.
+    Only the changed window (grown by one pixel) and the components touching it are relabelled, every other
+    component keeps its label and info.
+
+    Args:
+        labels: Label array of the previous frame, updated in place
+        components: Component info dict of the previous frame, updated in place
+        binary: The new binary mask
+        changed_rows, changed_cols: Boolean arrays marking rows/columns containing changed pixels
+        next_label: First unused label
+
+    Returns:
+        (next_label, affected): the new first unused label and the set of labels that were replaced
+    """
+    height, width = binary.shape
+    ys, xs = np.flatnonzero(changed_rows), np.flatnonzero(changed_cols)
+    # A changed pixel can only join or split components that have a pixel within one pixel of it
+    win_y0, win_y1 = max(0, ys[0] - 1), min(height, ys[-1] + 2)
+    win_x0, win_x1 = max(0, xs[0] - 1), min(width, xs[-1] + 2)
+    affected = np.unique(labels[win_y0:win_y1, win_x0:win_x1])
+    affected = affected[affected > 0]
+    y0, y1, x0, x1 = win_y0, win_y1, win_x0, win_x1
+    for label in affected:
+        info = components[label]
+        y0, y1 = min(y0, info['min_y']), max(y1, info['max_y'] + 1)
+        x0, x1 = min(x0, info['min_x']), max(x1, info['max_x'] + 1)
+    region_labels = labels[y0:y1, x0:x1]
+    # Relabel the new pixels in the window plus the (unchanged) rest of the affected components,
+    # ignoring unaffected components that happen to overlap the region
+    keep = np.isin(region_labels, affected)
+    in_window = np.zeros(region_labels.shape, dtype=bool)
+    in_window[win_y0 - y0:win_y1 - y0, win_x0 - x0:win_x1 - x0] = True
+    new_labels, count = ndimage.label(binary[y0:y1, x0:x1] & (in_window | keep), structure=CONNECTIVITY_8)
+    region_labels[keep] = 0
+    relabelled = new_labels > 0
+    region_labels[relabelled] = new_labels[relabelled] + (next_label - 1)
+    for label in affected:
+        del components[label]
+    components.update(_describe_components(new_labels, count, (y0, x0), next_label - 1))
+    return next_label + count, set(affected.tolist())
+
+
+def select_component(components, sort_order, index):
+    """Sorts the components by sort_order and returns the info of the one at index, or None."""
+    components_info = list(components.values())
+    
+    # Sort components based on sort_order
+    if sort_order == "left-right":
+        components_info.sort(key=lambda x: x['center_x'])
+    elif sort_order == "right-left":
+        components_info.sort(key=lambda x: x['center_x'], reverse=True)
+    elif sort_order == "top-bottom":
+        components_info.sort(key=lambda x: x['center_y'])
+    elif sort_order == "bottom-top":
+        components_info.sort(key=lambda x: x['center_y'], reverse=True)
+    elif sort_order == "largest-smallest":
+        components_info.sort(key=lambda x: x['area'], reverse=True)
+    elif sort_order == "smallest-largest":
+        components_info.sort(key=lambda x: x['area'])
+    
+    # Check if index is valid
+    if index >= len(components_info):
+        return None
+    return components_info[index]
+
+
+def filter_components(components, min_area=0, areas=None):
+    """
+    Drops the components smaller than min_area pixels, using the areas from the labelling histogram or, if
+    given, the per-label pixel counts in 'areas' (see source_areas).
+
+    Returns:
+        (components, discarded): the remaining components and the number of dropped ones
+    """
+    if min_area <= 1:
+        return components, 0
+    if areas is None:
+        kept = {label: info for label, info in components.items() if info['area'] >= min_area}
+    else:
+        kept = {label: info for label, info in components.items() if label < len(areas) and areas[label] >= min_area}
+    return kept, len(components) - len(kept)
+
+
+def source_areas(labels, source):
+    """
+    Counts the non-zero pixels of 'source' under each label, e.g. the area each component of a grown mask had
+    before growing.  Returns an array indexed by label.
+    """
+    return np.bincount(labels[source > 0].ravel())
+
+
+def _component_slices(info):
+    return slice(info['min_y'], info['max_y'] + 1), slice(info['min_x'], info['max_x'] + 1)
+
 
 class WCSeparateMaskComponents:
     """
@@ -140,16 +1371,20 @@ class WCSeparateMaskComponents:
             },
             "optional": {
                 "orig_mask": ("MASK",),
+                "temporal": ("BOOLEAN", {"default": False, "tooltip": "If true, the mask batch is treated as a frame sequence: the component is picked on the first frame and tracked through the following frames, only relabelling regions that changed."}),
+                "integral": ("WC_MASK_INTEGRAL", {"tooltip": "Optional summed-area table of the same mask (from WCMaskIntegral), used to skip labelling empty masks."}),
+                "min_area": ("INT", {"default": 0, "min": 0, "max": 16777216, "tooltip": "Components with fewer pixels than this are ignored, so specks do not count toward the index or sort order. If orig_mask is connected its non-zero pixels are counted instead, so a mask grown to merge features is filtered by its size before growing. 0 to keep all."}),
+                "min_fraction": ("FLOAT", {"default": 0.0, "min": 0.0, "max": 1.0, "step": 0.0001, "tooltip": "Components covering less than this fraction of the frame are ignored, counted like min_area. 0 to keep all."}),
             }
         }
 
-    RETURN_TYPES = ("MASK",)
-    RETURN_NAMES = ("mask",)
+    RETURN_TYPES = ("MASK", "INT")
+    RETURN_NAMES = ("mask", "discarded")
     FUNCTION = "separate"
 
     CATEGORY = "WC/masks"
 
-    def separate(self, mask, sort_order, index, orig_mask=None):
+    def separate(self, mask, sort_order, index, orig_mask=None, temporal=False, integral=None, min_area=0, min_fraction=0.0):
         """
         Separates a mask into contiguous components and returns the component at the specified index.
         
@@ -158,12 +1393,24 @@ class WCSeparateMaskComponents:
             sort_order: How to sort the found components
             index: Which component to return (0-based)
             orig_mask: Optional original mask to use for output values
+            temporal: Track the selected component through all frames of the batch
+            integral: Optional MaskIntegral of the mask
+            min_area: Components smaller than this many pixels (of orig_mask, if given) are ignored
+            min_fraction: Components smaller than this fraction of the frame are ignored
         
         Returns:
-            A mask with only the selected component
+            A mask with only the selected component, and the number of ignored components
         """
         # Use original mask values if provided, otherwise use input mask
         source_mask = orig_mask if orig_mask is not None else mask
+        min_area = max(min_area, math.ceil(min_fraction * mask.shape[-2] * mask.shape[-1]))
+        
+        # Nothing to label
+        if integral is not None and integral.is_empty(None if temporal else 0):
+            return (torch.zeros_like(mask), 0)
+        
+        if temporal and len(mask.shape) == 3:
+            return self._separate_sequence(mask, source_mask, sort_order, index, min_area, orig_mask is not None)
         
         # Get the first batch item (assuming single batch for mask processing)
         if len(mask.shape) == 3:
@@ -173,80 +1420,25 @@ class WCSeparateMaskComponents:
             mask_np = mask.cpu().numpy()
             source_np = source_mask.cpu().numpy()
         
-        # Create binary mask (values > 0)
-        binary_mask = mask_np > 0
-        
-        # Create 8-connectivity structure (includes diagonals)
-        structure = np.ones((3, 3), dtype=bool)
-        
-        # Find connected components using scipy with 8-connectivity
-        labeled_array, num_features = ndimage.label(binary_mask, structure=structure)
-        
-        if num_features == 0:
-            # No components found, return empty mask
-            return (torch.zeros_like(mask),)
-        
-        # Get component information for sorting
-        components_info = []
-        for i in range(1, num_features + 1):  # Labels start from 1
-            component_mask = labeled_array == i
-            
-            # Calculate properties for sorting
-            coords = np.where(component_mask)
-            if len(coords[0]) == 0:
-                continue
-                
-            # Calculate bounding box and center
-            min_y, max_y = coords[0].min(), coords[0].max()
-            min_x, max_x = coords[1].min(), coords[1].max()
-            center_y = (min_y + max_y) / 2
-            center_x = (min_x + max_x) / 2
-            area = np.sum(component_mask)
-            
-            components_info.append({
-                'label': i,
-                'center_x': center_x,
-                'center_y': center_y,
-                'min_x': min_x,
-                'max_x': max_x,
-                'min_y': min_y,
-                'max_y': max_y,
-                'area': area,
-                'mask': component_mask
-            })
-        
-        if not components_info:
-            # No valid components found
-            return (torch.zeros_like(mask),)
-        
-        # Sort components based on sort_order
-        if sort_order == "left-right":
-            components_info.sort(key=lambda x: x['center_x'])
-        elif sort_order == "right-left":
-            components_info.sort(key=lambda x: x['center_x'], reverse=True)
-        elif sort_order == "top-bottom":
-            components_info.sort(key=lambda x: x['center_y'])
-        elif sort_order == "bottom-top":
-            components_info.sort(key=lambda x: x['center_y'], reverse=True)
-        elif sort_order == "largest-smallest":
-            components_info.sort(key=lambda x: x['area'], reverse=True)
-        elif sort_order == "smallest-largest":
-            components_info.sort(key=lambda x: x['area'])
-        
-        # Check if index is valid
-        if index >= len(components_info):
-            # Index out of range, return empty mask
-            return (torch.zeros_like(mask),)
+        # Find connected components (values > 0) using scipy with 8-connectivity
+        binary = mask_np > 0
+        labeled_array, components = cached_label_components(binary)
+        # Filter on the original mask's pixels, the mask may have been grown to merge nearby features
+        areas = source_areas(labeled_array, source_np) if orig_mask is not None and min_area > 1 else None
+        components, discarded = filter_components(components, min_area, areas)
         
         # Get the selected component
-        selected_component = components_info[index]
+        selected_component = select_component(components, sort_order, index)
+        if selected_component is None:
+            # No components found or index out of range, return empty mask
+            return (torch.zeros_like(mask), discarded)
         
         # Create output mask with same dimensions as input
         result_np = np.zeros_like(source_np)
         
         # Copy values from source mask where the selected component exists
-        component_coords = np.where(selected_component['mask'])
-        result_np[component_coords] = source_np[component_coords]
+        box, in_component = component_pixels(binary, labeled_array, selected_component)
+        result_np[box][in_component] = source_np[box][in_component]
         
         # Convert back to tensor with same shape as input
         if len(mask.shape) == 3:
@@ -254,7 +1446,59 @@ class WCSeparateMaskComponents:
         else:
             result_tensor = torch.from_numpy(result_np).to(mask.device, dtype=mask.dtype)
         
-        return (result_tensor,)
+        return (result_tensor, discarded)
+
+    def _separate_sequence(self, mask, source_mask, sort_order, index, min_area=0, source_area=False):
+        """
+        Picks the component on the first frame where it exists and tracks it through the rest of the sequence.
+        Each frame is only relabelled where it differs from the previous one, and the tracked component is
+        re-identified by pixel overlap (or nearest center) only when its own pixels were affected.
+        Components below min_area are never picked; the number of them on the first frame is returned.  With
+        source_area the areas are counted on source_mask instead.
+        """
+        binary = mask.cpu().numpy() > 0
+        source_np = source_mask.reshape((-1, source_mask.shape[-2], source_mask.shape[-1])).cpu().numpy()
+        result_np = np.zeros(binary.shape, dtype=source_np.dtype)
+        
+        labels, components = label_components(binary[0])
+        source_area = source_area and min_area > 1
+        discarded = filter_components(components, min_area, source_areas(labels, source_np[0]) if source_area else None)[1]
+        next_label = max(components, default=0) + 1
+        selected, last_center = None, None
+        for f in range(binary.shape[0]):
+            if f > 0:
+                changed = binary[f] != binary[f - 1]
+                changed_rows = np.any(changed, axis=1)
+                if np.any(changed_rows):
+                    previous_box = _component_slices(components[selected]) if selected is not None else None
+                    previous_pixels = labels[previous_box] == selected if selected is not None else None
+                    next_label, affected = update_components(labels, components, binary[f], changed_rows, np.any(changed, axis=0), next_label)
+                    if selected in affected:
+                        # Follow the new component that took over most of the tracked component's pixels
+                        overlap = np.bincount(labels[previous_box][previous_pixels], minlength=1)
+                        overlap[0] = 0
+                        selected = int(np.argmax(overlap)) if overlap.max() > 0 else None
+            source_frame = source_np[f] if source_np.shape[0] > 1 else source_np[0]
+            candidates = None
+            if selected is None:
+                candidates = filter_components(components, min_area, source_areas(labels, source_frame) if source_area else None)[0]
+            if candidates:
+                if last_center is None:
+                    found = select_component(candidates, sort_order, index)
+                else:
+                    # Lost track, take the component closest to where it was last seen
+                    found = min(candidates.values(), key=lambda c: (c['center_x'] - last_center[0]) ** 2 + (c['center_y'] - last_center[1]) ** 2)
+                selected = found['label'] if found is not None else None
+            if selected is None:
+                continue
+            
+            info = components[selected]
+            last_center = (info['center_x'], info['center_y'])
+            box = _component_slices(info)
+            in_component = labels[box] == selected
+            result_np[f][box][in_component] = source_frame[box][in_component]
+        
+        return (torch.from_numpy(result_np).to(mask.device, dtype=mask.dtype), discarded)
 
 class WCBoxMask:
     """
@@ -332,6 +1576,9 @@ class WCBoundingBoxMask:
         return {
             "required": {
                 "mask": ("MASK",),
+            },
+            "optional": {
+                "integral": ("WC_MASK_INTEGRAL", {"tooltip": "Optional summed-area table of the same mask (from WCMaskIntegral), used instead of scanning the mask."}),
             }
         }
 
@@ -340,12 +1587,13 @@ class WCBoundingBoxMask:
     FUNCTION = "create_bounding_box_mask"
     CATEGORY = "WC/masks"
 
-    def create_bounding_box_mask(self, mask):
+    def create_bounding_box_mask(self, mask, integral=None):
         """
         Creates a bounding box mask from the input mask.
         
         Args:
             mask: Input mask tensor to find bounding box for
+            integral: Optional MaskIntegral of the mask, used instead of scanning it
         
         Returns:
             A mask tensor where the bounding box area is filled with 1.0 and everything else is 0.0
@@ -360,32 +1608,25 @@ class WCBoundingBoxMask:
         else:
             raise ValueError(f"Unexpected mask shape: {mask.shape}")
         
+        result = torch.zeros((batch_size, height, width), dtype=torch.float32, device=mask.device)
+        
         # Process each mask in the batch
-        output_masks = []
-        for i in range(batch_size):
-            current_mask = mask[i]
-            
-            # Find non-zero pixels
-            nonzero_indices = torch.nonzero(current_mask > 0, as_tuple=False)
-            
-            if len(nonzero_indices) == 0:
-                # If mask is empty, return empty mask
-                bbox_mask = torch.zeros((height, width), dtype=torch.float32, device=mask.device)
+        def fill_item(i):
+            # Find rows and columns containing non-zero pixels
+            if integral is not None:
+                cols, rows = integral.col_occupancy(i), integral.row_occupancy(i)
             else:
-                # Find bounding box coordinates
-                min_y = torch.min(nonzero_indices[:, 0]).item()
-                max_y = torch.max(nonzero_indices[:, 0]).item()
-                min_x = torch.min(nonzero_indices[:, 1]).item()
-                max_x = torch.max(nonzero_indices[:, 1]).item()
-                
-                # Create bounding box mask
-                bbox_mask = torch.zeros((height, width), dtype=torch.float32, device=mask.device)
-                bbox_mask[min_y:max_y+1, min_x:max_x+1] = 1.0
+                cols, rows = mask_occupancy(mask[i], torch.gt)
+            x_extent = occupancy_extent(cols)
             
-            output_masks.append(bbox_mask)
-        
-        # Stack back into batch format
-        result = torch.stack(output_masks, dim=0)
+            # If mask is empty, leave the output empty
+            if x_extent is not None:
+                # Fill bounding box
+                min_x, max_x = x_extent
+                min_y, max_y = occupancy_extent(rows)
+                result[i, min_y:max_y+1, min_x:max_x+1] = 1.0
+        
+        map_items(fill_item, batch_size, height * width)
         return (result,)
 
 
@@ -433,29 +1674,15 @@ class WCCircleMask:
             raise ValueError(f"Unexpected image shape: {image.shape}")
         
         # Create mask with same height/width as image
-        mask = torch.zeros((img_height, img_width), dtype=torch.float32, device=image.device)
+        circle_mask = torch.empty((img_height, img_width), dtype=torch.float32, device=image.device)
         
         # Calculate pixel coordinates from percentages
         center_x = x * img_width
         center_y = y * img_height
-        # Use smaller dimension for radius calculation to maintain circular shape
-        pixel_radius = radius * min(img_width, img_height)
-        
-        # Create coordinate grids
-        y_coords, x_coords = torch.meshgrid(
-            torch.arange(img_height, dtype=torch.float32, device=image.device),
-            torch.arange(img_width, dtype=torch.float32, device=image.device),
-            indexing='ij'
-        )
         
-        # Calculate normalized distances to create true circles regardless of aspect ratio
-        # Normalize coordinates to [0,1] range to account for different image dimensions
-        norm_x = (x_coords - center_x) / min(img_width, img_height)
-        norm_y = (y_coords - center_y) / min(img_width, img_height)
-        distances = torch.sqrt(norm_x ** 2 + norm_y ** 2)
-        
-        # Create circle mask - pixels within radius get the strength value
-        circle_mask = (distances <= radius).float() * strength
+        # Normalize distances by the smaller dimension to create true circles regardless of aspect ratio,
+        # pixels within radius get the strength value
+        _fill_circle(circle_mask, center_x, center_y, min(img_width, img_height), radius, strength)
         
         # Return mask with batch dimension
         return (circle_mask.unsqueeze(0),)
@@ -491,77 +1718,22 @@ class WCBoundingCircleMask:
         """
         # Handle batch dimension
         if len(mask.shape) == 3:
-            batch_size, height, width = mask.shape
             output_mask = torch.zeros_like(mask)
-            
-            for b in range(batch_size):
-                single_mask = mask[b]
-                
-                # Find non-zero pixels
-                nonzero_indices = torch.nonzero(single_mask, as_tuple=False)
-                
-                if len(nonzero_indices) > 0:
-                    # Convert to float for calculations
-                    points = nonzero_indices.float()
-                    
-                    # Find center as centroid of all non-zero pixels
-                    center_y = torch.mean(points[:, 0])
-                    center_x = torch.mean(points[:, 1])
-                    
-                    # Find maximum distance from center to any non-zero pixel
-                    distances = torch.sqrt((points[:, 1] - center_x) ** 2 + (points[:, 0] - center_y) ** 2)
-                    radius = torch.max(distances)
-                    
-                    # Create coordinate grids
-                    y_coords, x_coords = torch.meshgrid(
-                        torch.arange(height, dtype=torch.float32, device=mask.device),
-                        torch.arange(width, dtype=torch.float32, device=mask.device),
-                        indexing='ij'
-                    )
-                    
-                    # Calculate distance from center for each pixel
-                    pixel_distances = torch.sqrt((x_coords - center_x) ** 2 + (y_coords - center_y) ** 2)
-                    
-                    # Create circle mask
-                    output_mask[b] = (pixel_distances <= radius).float()
-                
         elif len(mask.shape) == 2:
-            height, width = mask.shape
+            mask = mask.unsqueeze(0)
             output_mask = torch.zeros_like(mask)
-            
-            # Find non-zero pixels
-            nonzero_indices = torch.nonzero(mask, as_tuple=False)
-            
-            if len(nonzero_indices) > 0:
-                # Convert to float for calculations
-                points = nonzero_indices.float()
-                
-                # Find center as centroid of all non-zero pixels
-                center_y = torch.mean(points[:, 0])
-                center_x = torch.mean(points[:, 1])
-                
-                # Find maximum distance from center to any non-zero pixel
-                distances = torch.sqrt((points[:, 1] - center_x) ** 2 + (points[:, 0] - center_y) ** 2)
-                radius = torch.max(distances)
-                
-                # Create coordinate grids
-                y_coords, x_coords = torch.meshgrid(
-                    torch.arange(height, dtype=torch.float32, device=mask.device),
-                    torch.arange(width, dtype=torch.float32, device=mask.device),
-                    indexing='ij'
-                )
-                
-                # Calculate distance from center for each pixel
-                pixel_distances = torch.sqrt((x_coords - center_x) ** 2 + (y_coords - center_y) ** 2)
-                
-                # Create circle mask
-                output_mask = (pixel_distances <= radius).float()
-            
-            # Add batch dimension
-            output_mask = output_mask.unsqueeze(0)
         else:
             raise ValueError(f"Unexpected mask shape: {mask.shape}")
         
+        def fill_item(b):
+            # Center at the centroid of all non-zero pixels, radius reaching the farthest of them
+            circle = bounding_circle(mask[b])
+            
+            if circle is not None:
+                # Create circle mask from the distance of each pixel to the center
+                _fill_circle(output_mask[b], *circle[:2], 1, circle[2])
+        
+        map_items(fill_item, mask.shape[0], mask.shape[1] * mask.shape[2])
         return (output_mask,)
 
 
@@ -610,27 +1782,15 @@ class WCOvalMask:
             raise ValueError(f"Unexpected image shape: {image.shape}")
         
         # Create mask with same height/width as image
-        mask = torch.zeros((img_height, img_width), dtype=torch.float32, device=image.device)
+        oval_mask = torch.empty((img_height, img_width), dtype=torch.float32, device=image.device)
         
         # Calculate pixel coordinates from percentages
         center_x = x * img_width
         center_y = y * img_height
         
-        # Create coordinate grids
-        y_coords, x_coords = torch.meshgrid(
-            torch.arange(img_height, dtype=torch.float32, device=image.device),
-            torch.arange(img_width, dtype=torch.float32, device=image.device),
-            indexing='ij'
-        )
-        
-        # Calculate normalized distances to create true ovals regardless of aspect ratio
-        # Normalize coordinates to [0,1] range to account for different image dimensions
-        norm_x = (x_coords - center_x) / min(img_width, img_height)
-        norm_y = (y_coords - center_y) / min(img_width, img_height)
-        
+        # Normalize distances by the smaller dimension to create true ovals regardless of aspect ratio
         # Ellipse equation: (x/a)² + (y/b)² <= 1
-        ellipse_mask = ((norm_x / width) ** 2 + (norm_y / height) ** 2) <= 1.0
-        oval_mask = ellipse_mask.float() * strength
+        _fill_ellipse(oval_mask, center_x, center_y, min(img_width, img_height), width, height, strength)
         
         # Return mask with batch dimension
         return (oval_mask.unsqueeze(0),)
@@ -668,66 +1828,21 @@ class WCBoundingOvalMask:
         """
         # Handle batch dimension
         if len(mask.shape) == 3:
-            batch_size, height, width = mask.shape
             output_mask = torch.zeros_like(mask)
-            
-            for b in range(batch_size):
-                single_mask = mask[b]
-                
-                # Find non-zero pixels
-                nonzero_indices = torch.nonzero(single_mask, as_tuple=False)
-                
-                if len(nonzero_indices) > 0:
-                    # Find bounding box of non-zero pixels
-                    min_y = torch.min(nonzero_indices[:, 0]).item()
-                    max_y = torch.max(nonzero_indices[:, 0]).item()
-                    min_x = torch.min(nonzero_indices[:, 1]).item()
-                    max_x = torch.max(nonzero_indices[:, 1]).item()
-                    
-                    # Calculate oval parameters from bounding box
-                    center_x = (min_x + max_x) / 2.0
-                    center_y = (min_y + max_y) / 2.0
-                    
-                    if mode == "circumscribed":
-                        # Oval contains all corners of bounding box
-                        # For an ellipse to contain all corners while maintaining aspect ratio,
-                        # we need to scale the inscribed ellipse by √2
-                        import math
-                        corner_dist_x = (max_x - min_x) / 2.0
-                        corner_dist_y = (max_y - min_y) / 2.0
-                        scale_factor = math.sqrt(2)
-                        oval_width = corner_dist_x * scale_factor
-                        oval_height = corner_dist_y * scale_factor
-                    else:  # inscribed
-                        # Oval fits inside bounding box (original behavior)
-                        oval_width = (max_x - min_x) / 2.0
-                        oval_height = (max_y - min_y) / 2.0
-                    
-                    # Create coordinate grids
-                    y_coords, x_coords = torch.meshgrid(
-                        torch.arange(height, dtype=torch.float32, device=mask.device),
-                        torch.arange(width, dtype=torch.float32, device=mask.device),
-                        indexing='ij'
-                    )
-                    
-                    # Calculate ellipse equation: (x-cx)²/a² + (y-cy)²/b² <= 1
-                    if oval_width > 0 and oval_height > 0:
-                        ellipse_eq = ((x_coords - center_x) / oval_width) ** 2 + ((y_coords - center_y) / oval_height) ** 2
-                        output_mask[b] = (ellipse_eq <= 1.0).float()
-                
         elif len(mask.shape) == 2:
-            height, width = mask.shape
+            mask = mask.unsqueeze(0)
             output_mask = torch.zeros_like(mask)
+        else:
+            raise ValueError(f"Unexpected mask shape: {mask.shape}")
+        
+        def fill_item(b):
+            # Find bounding box of non-zero pixels
+            cols, rows = mask_occupancy(mask[b])
+            x_extent = occupancy_extent(cols)
             
-            # Find non-zero pixels
-            nonzero_indices = torch.nonzero(mask, as_tuple=False)
-            
-            if len(nonzero_indices) > 0:
-                # Find bounding box of non-zero pixels
-                min_y = torch.min(nonzero_indices[:, 0]).item()
-                max_y = torch.max(nonzero_indices[:, 0]).item()
-                min_x = torch.min(nonzero_indices[:, 1]).item()
-                max_x = torch.max(nonzero_indices[:, 1]).item()
+            if x_extent is not None:
+                min_x, max_x = x_extent
+                min_y, max_y = occupancy_extent(rows)
                 
                 # Calculate oval parameters from bounding box
                 center_x = (min_x + max_x) / 2.0
@@ -737,7 +1852,6 @@ class WCBoundingOvalMask:
                     # Oval contains all corners of bounding box
                     # For an ellipse to contain all corners while maintaining aspect ratio,
                     # we need to scale the inscribed ellipse by √2
-                    import math
                     corner_dist_x = (max_x - min_x) / 2.0
                     corner_dist_y = (max_y - min_y) / 2.0
                     scale_factor = math.sqrt(2)
@@ -748,23 +1862,11 @@ class WCBoundingOvalMask:
                     oval_width = (max_x - min_x) / 2.0
                     oval_height = (max_y - min_y) / 2.0
                 
-                # Create coordinate grids
-                y_coords, x_coords = torch.meshgrid(
-                    torch.arange(height, dtype=torch.float32, device=mask.device),
-                    torch.arange(width, dtype=torch.float32, device=mask.device),
-                    indexing='ij'
-                )
-                
                 # Calculate ellipse equation: (x-cx)²/a² + (y-cy)²/b² <= 1
                 if oval_width > 0 and oval_height > 0:
-                    ellipse_eq = ((x_coords - center_x) / oval_width) ** 2 + ((y_coords - center_y) / oval_height) ** 2
-                    output_mask = (ellipse_eq <= 1.0).float()
-            
-            # Add batch dimension
-            output_mask = output_mask.unsqueeze(0)
-        else:
-            raise ValueError(f"Unexpected mask shape: {mask.shape}")
+                    _fill_ellipse(output_mask[b], center_x, center_y, 1, oval_width, oval_height)
         
+        map_items(fill_item, mask.shape[0], mask.shape[1] * mask.shape[2])
         return (output_mask,)
 
 class WCHullMask:
@@ -777,6 +1879,10 @@ class WCHullMask:
         return {
             "required": {
                 "mask": ("MASK",),
+            },
+            "optional": {
+                "temporal": ("BOOLEAN", {"default": False, "tooltip": "If true, the mask batch is treated as a frame sequence: unchanged frames reuse the previous hull and only changed rows are re-scanned."}),
+                "per_component": ("BOOLEAN", {"default": False, "tooltip": "If true, every 8-connected component gets its own hull instead of one hull spanning all of them (e.g. two separate hands stay separate). A mask with a single component gives the same result either way."}),
             }
         }
 
@@ -785,75 +1891,133 @@ class WCHullMask:
     FUNCTION = "create_hull_mask"
     CATEGORY = "WC/masks"
 
-    def create_hull_mask(self, mask):
+    def create_hull_mask(self, mask, temporal=False, per_component=False):
         """
         Creates a convex hull mask from the input mask.
         
         Args:
             mask: Input mask tensor to find convex hull for
+            temporal: Reuse the analysis of the previous frame for the parts of each frame that did not change
+            per_component: Hull every connected component separately
         
         Returns:
             A mask tensor where the convex hull area is filled with 1.0 and everything else is 0.0
         """
         # Handle batch dimension
-        if len(mask.shape) == 3:
-            batch_size, height, width = mask.shape
-            output_mask = torch.zeros_like(mask)
-            
-            for b in range(batch_size):
-                single_mask = mask[b]
-                
-                # Find non-zero pixels
-                nonzero_indices = torch.nonzero(single_mask, as_tuple=False)
-                
-                if len(nonzero_indices) > 0:
-                    # Convert to numpy for convex hull computation
-                    points = nonzero_indices.cpu().numpy()
-                    
-                    # Compute convex hull using Graham scan algorithm
-                    hull_points = self._convex_hull(points)
-                    
-                    if len(hull_points) >= 3:
-                        # Create mask by filling the convex hull polygon
-                        output_mask[b] = self._fill_polygon(hull_points, height, width, mask.device)
-                    elif len(hull_points) > 0:
-                        # If we have fewer than 3 points, just fill those points
-                        for point in hull_points:
-                            y, x = point
-                            if 0 <= y < height and 0 <= x < width:
-                                output_mask[b, y, x] = 1.0
-                
-        elif len(mask.shape) == 2:
-            height, width = mask.shape
-            output_mask = torch.zeros_like(mask)
-            
-            # Find non-zero pixels
-            nonzero_indices = torch.nonzero(mask, as_tuple=False)
+        if len(mask.shape) == 2:
+            mask = mask.unsqueeze(0)
+        elif len(mask.shape) != 3:
+            raise ValueError(f"Unexpected mask shape: {mask.shape}")
+        if per_component:
+            return (self._component_hulls(mask),)
+        if temporal:
+            return (self._hull_sequence(mask),)
+        output_mask = torch.zeros_like(mask)
+        
+        def hull_item(b):
+            binary = mask[b].cpu().numpy() != 0
             
-            if len(nonzero_indices) > 0:
-                # Convert to numpy for convex hull computation
-                points = nonzero_indices.cpu().numpy()
-                
-                # Compute convex hull using Graham scan algorithm
-                hull_points = self._convex_hull(points)
-                
-                if len(hull_points) >= 3:
-                    # Create mask by filling the convex hull polygon
-                    output_mask = self._fill_polygon(hull_points, height, width, mask.device)
-                elif len(hull_points) > 0:
-                    # If we have fewer than 3 points, just fill those points
-                    for point in hull_points:
-                        y, x = point
-                        if 0 <= y < height and 0 <= x < width:
-                            output_mask[y, x] = 1.0
+            def compute():
+                # The hull only depends on the leftmost and rightmost non-zero pixel of each row
+                points = row_extreme_points(binary)
+                return np.array(self._convex_hull(points[:, ::-1].copy()), dtype=np.int64).reshape(-1, 2)
             
-            # Add batch dimension
-            output_mask = output_mask.unsqueeze(0)
-        else:
-            raise ValueError(f"Unexpected mask shape: {mask.shape}")
+            self._fill_hull(output_mask[b], _geometry_cache.cached("hull", binary, compute))
         
+        map_items(hull_item, mask.shape[0], mask.shape[1] * mask.shape[2])
         return (output_mask,)
 
+    def _hull_sequence(self, mask):
+        """
+        Computes the hull of every frame of a sequence.  The hull only depends on the leftmost and rightmost
+        pixel of each row, so those are carried from frame to frame and only rows that changed are re-scanned.
+        """
+        frames, height, width = mask.shape
+        output_mask = torch.zeros_like(mask)
+        binary = mask.cpu().numpy() != 0
+        has_pixels = np.zeros(height, dtype=bool)
+        left = np.zeros(height, dtype=np.int64)
+        right = np.zeros(height, dtype=np.int64)
+        rows_to_scan = np.ones(height, dtype=bool)
+        for f in range(frames):
+            if f > 0:
+                rows_to_scan = np.any(binary[f] != binary[f - 1], axis=1)
+                if not np.any(rows_to_scan):
+                    output_mask[f] = output_mask[f - 1]
+                    continue
+            scanned = binary[f][rows_to_scan]
+            has_pixels[rows_to_scan] = np.any(scanned, axis=1)
+            left[rows_to_scan] = np.argmax(scanned, axis=1)
+            right[rows_to_scan] = width - 1 - np.argmax(scanned[:, ::-1], axis=1)
+            ys = np.flatnonzero(has_pixels)
+            if len(ys) > 0:
+                points = np.concatenate([np.stack([ys, left[ys]], axis=1), np.stack([ys, right[ys]], axis=1)])
+                self._draw_hull(output_mask[f], np.unique(points, axis=0))
+        return output_mask
+
+    def _component_hulls(self, mask):
+        """
+        Labels every frame once and fills the convex hull of each component.  A component's hull only depends
+        on the ends of its horizontal pixel runs, which are found for all components at once; the hulls are
+        then rasterized together in one batched fill, with the same fill rule as the single hull.  Frames equal
+        to the previous one reuse its result.
+        """
+        output_mask = torch.zeros_like(mask)
+        binary = mask.cpu().numpy() != 0
+        frames = [f for f in range(binary.shape[0]) if f == 0 or not np.array_equal(binary[f], binary[f - 1])]
+        
+        def hull_frame(i):
+            f = frames[i]
+            
+            def compute():
+                # Vertices of all hulls as [polygon, y, x] rows
+                labels, count = ndimage.label(binary[f], structure=CONNECTIVITY_8)
+                polygons = component_hulls(labels, count)
+                if not polygons:
+                    return np.zeros((0, 3), dtype=np.int64)
+                return np.concatenate([np.insert(polygon, 0, p, axis=1) for p, polygon in enumerate(polygons)]).astype(np.int64)
+            
+            vertices = _geometry_cache.cached("component hull vertices", binary[f], compute)
+            if len(vertices) > 0:
+                polygon_starts = np.flatnonzero(np.diff(vertices[:, 0])) + 1
+                hulls = np.split(np.asarray(vertices[:, 1:]), polygon_starts)
+                fill_convex_polygons(output_mask[f], [hull for hull in hulls if len(hull) >= 3])
+                # Single pixels and straight lines have no polygon, like _fill_hull only their hull points are set
+                points = [hull for hull in hulls if len(hull) < 3]
+                if points:
+                    points = torch.from_numpy(np.concatenate(points))
+                    output_mask[f][points[:, 0], points[:, 1]] = 1.0
+        
+        map_items(hull_frame, len(frames), binary.shape[1] * binary.shape[2])
+        drawn = set(frames)
+        for f in range(1, binary.shape[0]):
+            if f not in drawn:
+                output_mask[f] = output_mask[f - 1]
+        return output_mask
+
+    def _draw_hull(self, output, points):
+        """
+        Draws the convex hull of the given [[y, x], ...] points into a 2D output tensor.
+        """
+        # Compute convex hull using Graham scan algorithm
+        self._fill_hull(output, self._convex_hull(points))
+
+    def _fill_hull(self, output, hull_points):
+        """
+        Fills the convex polygon with [[y, x], ...] vertices into a 2D output tensor.
+        """
+        height, width = output.shape
+        
+        if len(hull_points) >= 3:
+            # Create mask by filling the convex hull polygon
+            fill_convex_polygons(output, [np.array(hull_points)])
+        elif len(hull_points) > 0:
+            # If we have fewer than 3 points, just fill those points
+            for point in hull_points:
+                y, x = point
+                if 0 <= y < height and 0 <= x < width:
+                    output[y, x] = 1.0
+
     def _convex_hull(self, points):
         """
         Compute convex hull using Graham scan algorithm.
@@ -876,12 +2040,12 @@ class WCHullMask:
         points_xy[[0, start_idx]] = points_xy[[start_idx, 0]]
         start_point = points_xy[0]
         
-        # Sort points by polar angle with respect to start point
+        # Sort points by polar angle with respect to start point, nearer points first for equal angles
+        # so collinear points are dropped by the scan
         def polar_angle(p):
             dx = p[0] - start_point[0]
             dy = p[1] - start_point[1]
-            import math
-            return math.atan2(dy, dx)
+            return (math.atan2(dy, dx), dx * dx + dy * dy)
         
         # Sort remaining points by polar angle
         remaining_points = points_xy[1:]
@@ -905,54 +2069,530 @@ class WCHullMask:
         """Calculate cross product of vectors OA and OB"""
         return (a[0] - o[0]) * (b[1] - o[1]) - (a[1] - o[1]) * (b[0] - o[0])
 
-    def _fill_polygon(self, polygon_points, height, width, device):
+def row_extreme_points(binary):
+    """
+    Returns the leftmost and rightmost non-zero pixel of every row of a 2D boolean array as an [N, 2] array
+    of (x, y) pixel coordinates.  The convex hull of these points equals the hull of the whole mask.
+    """
+    ys = np.flatnonzero(np.any(binary, axis=1))
+    if len(ys) == 0:
+        return np.zeros((0, 2), dtype=np.int64)
+    rows = binary[ys]
+    left = np.argmax(rows, axis=1)
+    right = binary.shape[1] - 1 - np.argmax(rows[:, ::-1], axis=1)
+    points = np.concatenate([np.stack([left, ys], axis=1), np.stack([right, ys], axis=1)])
+    return np.unique(points, axis=0)
+
+
+def convex_hull(points):
+    """
+    Computes the convex hull of [N, 2] points with Andrew's monotone chain.
+
+    Returns:
+        The hull vertices in counter-clockwise order (in a y-up frame) without collinear points, or the unique
+        points themselves if there are fewer than 3
+    """
+    points = np.unique(points, axis=0)
+    if len(points) < 3:
+        return points
+    def half_hull(ordered):
+        hull = []
+        for p in ordered:
+            while len(hull) >= 2 and ((hull[-1][0] - hull[-2][0]) * (p[1] - hull[-2][1]) - (hull[-1][1] - hull[-2][1]) * (p[0] - hull[-2][0])) <= 0:
+                hull.pop()
+            hull.append(p)
+        return hull
+    ordered = points.tolist()
+    lower = half_hull(ordered)
+    upper = half_hull(reversed(ordered))
+    return np.array(lower[:-1] + upper[:-1], dtype=points.dtype)
+
+
+def component_hulls(labels, count):
+    """
+    Computes the convex hull of every component of a label array.  Only the first and last pixel of each
+    horizontal run can be a hull vertex, so those are gathered for all components in one vectorized pass.
+
+    Returns:
+        List of [N, 2] arrays of [y, x] hull vertices, one per component (components that are a single pixel
+        or a straight line have fewer than 3)
+    """
+    padded = np.pad(labels, ((0, 0), (1, 1)))
+    run_start = (padded[:, 1:-1] != padded[:, :-2]) & (labels != 0)
+    run_end = (padded[:, 1:-1] != padded[:, 2:]) & (labels != 0)
+    ys, xs = np.nonzero(run_start | run_end)
+    point_labels = labels[ys, xs]
+    order = np.argsort(point_labels, kind='stable')
+    ys, xs, point_labels = ys[order], xs[order], point_labels[order]
+    bounds = np.searchsorted(point_labels, np.arange(1, count + 2))
+    polygons = []
+    for label in range(1, count + 1):
+        start, end = bounds[label - 1], bounds[label]
+        hull = convex_hull(np.stack([xs[start:end], ys[start:end]], axis=1))
+        polygons.append(hull[:, ::-1])
+    return polygons
+
+
+def fill_convex_polygons(output, polygons):
+    """
+    Sets the pixels inside convex polygons to 1.0 in a 2D output tensor, all polygons in one batched pass.
+    Rasterizes like a scanline fill: each non-horizontal edge covers the rows y1 <= y < y2, its intersections
+    with them are truncated to pixels and the span between a row's intersections is filled inclusively.
+
+    Args:
+        output: 2D tensor to draw into
+        polygons: List of [N, 2] integer arrays of [y, x] vertices in order, N >= 3
+    """
+    height, width = output.shape
+    if not polygons:
+        return output
+    vertices = np.concatenate(polygons).astype(np.int64)
+    following = np.concatenate([np.roll(p, -1, axis=0) for p in polygons]).astype(np.int64)
+    polygon_ids = np.repeat(np.arange(len(polygons)), [len(p) for p in polygons])
+    # Edges as (y1, x1) -> (y2, x2) with y1 < y2, horizontal edges add no intersections
+    flip = vertices[:, 0] > following[:, 0]
+    start = np.where(flip[:, None], following, vertices)
+    end = np.where(flip[:, None], vertices, following)
+    keep = start[:, 0] != end[:, 0]
+    start, end, polygon_ids = start[keep], end[keep], polygon_ids[keep]
+    # One intersection per edge and covered row
+    counts = end[:, 0] - start[:, 0]
+    edge = np.repeat(np.arange(len(counts)), counts)
+    ys = start[edge, 0] + np.arange(len(edge)) - np.repeat(np.cumsum(counts) - counts, counts)
+    xs = start[edge, 1] + (end[edge, 1] - start[edge, 1]) * (ys - start[edge, 0]) / counts[edge]
+    inside = (ys >= 0) & (ys < height)
+    # A convex polygon crosses every covered row exactly twice, the span runs from the lower to the higher
+    keys, inverse = np.unique(polygon_ids[edge][inside] * height + ys[inside], return_inverse=True)
+    lows = np.full(len(keys), np.inf)
+    highs = np.full(len(keys), -np.inf)
+    np.minimum.at(lows, inverse, xs[inside])
+    np.maximum.at(highs, inverse, xs[inside])
+    rows = keys % height
+    span_start = np.maximum(0, np.trunc(lows).astype(np.int64))
+    span_end = np.minimum(width - 1, np.trunc(highs).astype(np.int64))
+    valid = span_start <= span_end
+    rows, span_start, span_end = rows[valid], span_start[valid], span_end[valid]
+    # Mark span starts and ends per row and integrate, banded to bound the temporary
+    for y0, y1 in row_bands(height, width, 9):
+        in_band = (rows >= y0) & (rows < y1)
+        if not np.any(in_band):
+            continue
+        edges = pooled_zeros((y1 - y0, width + 1), torch.int32)
+        coverage = pooled_empty((y1 - y0, width), torch.int32)
+        filled = pooled_empty((y1 - y0, width), torch.bool)
+        np.add.at(edges.numpy(), (rows[in_band] - y0, span_start[in_band]), 1)
+        np.add.at(edges.numpy(), (rows[in_band] - y0, span_end[in_band] + 1), -1)
+        np.cumsum(edges.numpy()[:, :width], axis=1, out=coverage.numpy())
+        torch.gt(coverage, 0, out=filled)
+        output[y0:y1].masked_fill_(filled.to(output.device), 1.0)
+        for buffer in (edges, coverage, filled):
+            release_buffer(buffer)
+    return output
+
+
+def min_area_rect(hull):
+    """
+    Finds the minimum-area enclosing rectangle of a convex hull with rotating calipers: the optimal rectangle
+    has a side collinear with one of the hull edges, so every edge direction is tried at once.
+
+    Args:
+        hull: [N, 2] hull vertices (x, y) in order
+
+    Returns:
+        (center_x, center_y, width, height, angle) where width is measured along the direction at 'angle'
+        degrees from the x axis and height perpendicular to it
+    """
+    hull = np.asarray(hull, dtype=np.float64)
+    if len(hull) < 3:
+        # A point or a segment, the rectangle is degenerate along its normal
+        start, end = hull[0], hull[-1]
+        direction = end - start
+        angle = math.atan2(direction[1], direction[0]) if np.any(direction) else 0.0
+        center = (start + end) / 2
+        return center[0], center[1], float(np.hypot(*direction)), 0.0, math.degrees(angle)
+    edges = np.roll(hull, -1, axis=0) - hull
+    edges = edges[np.any(edges != 0, axis=1)]
+    axis_u = edges / np.hypot(edges[:, 0], edges[:, 1])[:, None]
+    axis_v = np.stack([-axis_u[:, 1], axis_u[:, 0]], axis=1)
+    # Projections of every hull vertex on every candidate axis pair, [N, E]
+    proj_u = hull @ axis_u.T
+    proj_v = hull @ axis_v.T
+    min_u, max_u = proj_u.min(axis=0), proj_u.max(axis=0)
+    min_v, max_v = proj_v.min(axis=0), proj_v.max(axis=0)
+    best = int(np.argmin((max_u - min_u) * (max_v - min_v)))
+    mid_u, mid_v = (min_u[best] + max_u[best]) / 2, (min_v[best] + max_v[best]) / 2
+    center = mid_u * axis_u[best] + mid_v * axis_v[best]
+    angle = math.degrees(math.atan2(axis_u[best][1], axis_u[best][0]))
+    return center[0], center[1], max_u[best] - min_u[best], max_v[best] - min_v[best], angle
+
+
+def oriented_bounds(mask):
+    """
+    Computes the minimum-area oriented rectangle covering every non-zero pixel (as a unit square) of a 2D mask.
+
+    Returns:
+        (center_x, center_y, width, height, angle) in pixel coordinates, where pixel (x, y) covers
+        [x - 0.5, x + 0.5] x [y - 0.5, y + 0.5], or None if the mask is empty
+    """
+    points = row_extreme_points(mask > 0)
+    if len(points) == 0:
+        return None
+    center_x, center_y, width, height, angle = min_area_rect(convex_hull(points))
+    # Pixel centers were used, grow by half a pixel on every side to cover the whole pixels
+    return center_x, center_y, width + 1, height + 1, angle
+
+
+def _rect_axes(angle):
+    radians = math.radians(angle)
+    return math.cos(radians), math.sin(radians)
+
+
+def _rotated_rect_kernel(y_coords, x_coords, center_x, center_y, cos_a, sin_a, half_width, half_height):
+    dx = x_coords - center_x
+    dy = y_coords - center_y
+    u = dx * cos_a + dy * sin_a
+    v = dy * cos_a - dx * sin_a
+    return ((u.abs() <= half_width) & (v.abs() <= half_height)).float()
+
+def _rotated_rect_into(out, y_coords, x_coords, center_x, center_y, cos_a, sin_a, half_width, half_height):
+    dx = x_coords - center_x
+    dy = y_coords - center_y
+    u = pooled_empty(out.shape, torch.float32, out.device)
+    v = pooled_empty(out.shape, torch.float32, out.device)
+    inside_u = pooled_empty(out.shape, torch.bool, out.device)
+    inside_v = pooled_empty(out.shape, torch.bool, out.device)
+    torch.le(torch.add(dx * cos_a, dy * sin_a, out=u).abs_(), half_width, out=inside_u)
+    torch.le(torch.sub(dy * cos_a, dx * sin_a, out=v).abs_(), half_height, out=inside_v)
+    out.copy_(inside_u.logical_and_(inside_v))
+    for buffer in (u, v, inside_u, inside_v):
+        release_buffer(buffer)
+
+
+def _fill_rotated_rect(output, rect):
+    """Rasterizes an oriented rectangle (center_x, center_y, width, height, angle) into a 2D output tensor."""
+    center_x, center_y, width, height, angle = rect
+    height_px, width_px = output.shape
+    device = output.device
+    cos_a, sin_a = _rect_axes(angle)
+    args = [_scalar(v, device) for v in (center_x, center_y, cos_a, sin_a, width / 2, height / 2)]
+    for y0, y1 in row_bands(height_px, width_px, 24):
+        y_coords, x_coords = _pixel_coords(y0, y1, width_px, device)
+        run_kernel(_rotated_rect_kernel, (y1 - y0) * width_px, y_coords, x_coords, *args, out=output[y0:y1])
+    return output
+
+
+_EAGER_KERNELS = {
+    _composite_max_kernel: lambda out, destination, source: torch.fmax(destination, source, out=out),
+    _composite_min_kernel: lambda out, destination, source: torch.fmin(destination, source, out=out),
+    _circle_kernel: _circle_into,
+    _ellipse_kernel: _ellipse_into,
+    _blend_kernel: _blend_into,
+    _palette_blend_kernel: _palette_blend_into,
+    _rotated_rect_kernel: _rotated_rect_into,
+}
+
+
+def _rotated_sampling_grid(rect, out_width, out_height, source_width, source_height, device):
+    """
+    Builds a grid_sample grid [1, out_height, out_width, 2] that maps the pixels of an axis-aligned crop of
+    size out_width x out_height onto the oriented rectangle in a source of size source_width x source_height.
+    """
+    center_x, center_y, width, height, angle = rect
+    cos_a, sin_a = _rect_axes(angle)
+    # Local rectangle coordinates of the crop pixel centers
+    local_u = (torch.arange(out_width, dtype=torch.float32, device=device) + 0.5) * (width / out_width) - width / 2
+    local_v = (torch.arange(out_height, dtype=torch.float32, device=device) + 0.5) * (height / out_height) - height / 2
+    local_v, local_u = torch.meshgrid(local_v, local_u, indexing='ij')
+    source_x = center_x + local_u * cos_a - local_v * sin_a
+    source_y = center_y + local_u * sin_a + local_v * cos_a
+    # Normalize to [-1, 1] for grid_sample with align_corners=False
+    grid = torch.stack([(source_x + 0.5) / source_width * 2 - 1, (source_y + 0.5) / source_height * 2 - 1], dim=-1)
+    return grid.unsqueeze(0)
+
+
+class WCOrientedBoundingBoxMask:
+    """
+    Creates a minimum-area oriented (rotated) bounding box mask from an input mask, which is much tighter than
+    an axis-aligned box for tilted faces, diagonal limbs or rotated objects.
+    """
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "mask": ("MASK",),
+            }
+        }
+
+    RETURN_TYPES = ("MASK", "FLOAT")
+    RETURN_NAMES = ("mask", "angle")
+    FUNCTION = "create_oriented_bounding_box_mask"
+    CATEGORY = "WC/masks"
+    DESCRIPTION = "Finds the minimum-area rotated rectangle containing all non-zero pixels (rotating calipers on the convex hull) and returns it as a mask, along with its angle in degrees (of the first batch item)."
+
+    def create_oriented_bounding_box_mask(self, mask):
         """
-        Fill a polygon using scanline algorithm.
-        polygon_points is a list of [y, x] coordinates.
+        Creates an oriented bounding box mask from the input mask.
+        
+        Args:
+            mask: Input mask tensor to find the oriented bounding box for
+        
+        Returns:
+            A mask tensor where the rotated rectangle is filled with 1.0 and everything else is 0.0, and its angle
+        """
+        mask = mask.reshape((-1, mask.shape[-2], mask.shape[-1]))
+        output_mask = torch.zeros_like(mask)
+        mask_np = mask.cpu().numpy()
+        
+        def fill_item(b):
+            rect = oriented_bounds(mask_np[b])
+            if rect is not None:
+                _fill_rotated_rect(output_mask[b], rect)
+            return rect
+        
+        angles = [rect[4] for rect in map_items(fill_item, mask.shape[0], mask.shape[1] * mask.shape[2]) if rect is not None]
+        return (output_mask, angles[0] if angles else 0.0)
+
+
+class WCRotatedCrop:
+    """
+    Crops an image and mask to the minimum-area oriented rectangle around the mask, rotated so that the
+    rectangle becomes axis-aligned.  Use WCRotatedUncrop to put the (processed) crop back.
+    """
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "image": ("IMAGE",),
+                "mask": ("MASK",),
+                "grow": ("INT", {"default": 0, "min": 0, "max": 1024, "tooltip": "Number of pixels to grow the rectangle by on every side."}),
+            }
+        }
+
+    RETURN_TYPES = ("IMAGE", "MASK", "WC_ROTATED_CROP", "FLOAT")
+    RETURN_NAMES = ("image", "mask", "crop", "angle")
+    FUNCTION = "crop"
+    CATEGORY = "WC/masks"
+    DESCRIPTION = "Crops the image and mask to the rotated minimum-area rectangle around the (first) mask, so the crop contains little more than the object itself. Returns the crop description for WCRotatedUncrop and the rotation angle in degrees."
+
+    def crop(self, image, mask, grow):
         """
-        mask = torch.zeros((height, width), dtype=torch.float32, device=device)
+        Crops the image and mask to the oriented bounds of the mask.
         
-        if len(polygon_points) < 3:
-            return mask
+        Args:
+            image: Input image tensor [B, H, W, C]
+            mask: Input mask tensor [B, H, W] or [H, W]
+            grow: Number of pixels to grow the rectangle by on every side
         
-        # Create edge list
-        edges = []
-        n = len(polygon_points)
-        for i in range(n):
-            y1, x1 = polygon_points[i]
-            y2, x2 = polygon_points[(i + 1) % n]
-            
-            # Skip horizontal edges
-            if y1 == y2:
-                continue
-                
-            # Ensure y1 < y2
-            if y1 > y2:
-                y1, y2, x1, x2 = y2, y1, x2, x1
-            
-            edges.append((y1, y2, x1, x2))
+        Returns:
+            The rotated image and mask crops, the crop description and the angle in degrees
+        """
+        mask = mask.reshape((-1, mask.shape[-2], mask.shape[-1]))
+        _, height, width, _ = image.shape
+        rect = oriented_bounds(mask[0].cpu().numpy())
+        if rect is None:
+            # Empty mask, crop the whole image unrotated
+            rect = ((width - 1) / 2, (height - 1) / 2, width, height, 0.0)
+        center_x, center_y, rect_width, rect_height, angle = rect
+        rect = (center_x, center_y, rect_width + grow * 2, rect_height + grow * 2, angle)
+        out_width, out_height = max(1, math.ceil(rect[2])), max(1, math.ceil(rect[3]))
+        crop_info = {"rect": rect, "width": width, "height": height, "crop_width": out_width, "crop_height": out_height}
+        
+        grid = _rotated_sampling_grid(rect, out_width, out_height, width, height, image.device)
+        cropped_image = torch.nn.functional.grid_sample(
+            image.movedim(-1, 1), grid.expand(image.shape[0], -1, -1, -1).to(image.dtype),
+            mode='bilinear', padding_mode='border', align_corners=False
+        ).movedim(1, -1)
+        cropped_mask = torch.nn.functional.grid_sample(
+            mask.unsqueeze(1), grid.expand(mask.shape[0], -1, -1, -1).to(mask.dtype),
+            mode='bilinear', padding_mode='zeros', align_corners=False
+        ).squeeze(1)
+        return (cropped_image, cropped_mask, crop_info, angle)
+
+
+class WCRotatedUncrop:
+    """
+    Puts a crop made by WCRotatedCrop (usually after processing it) back into the image, rotating it back.
+    """
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "image": ("IMAGE",),
+                "cropped_image": ("IMAGE",),
+                "crop": ("WC_ROTATED_CROP",),
+            },
+            "optional": {
+                "cropped_mask": ("MASK", {"tooltip": "Mask in crop space used to blend the crop back. If not set, the whole rotated rectangle is replaced."}),
+            }
+        }
+
+    RETURN_TYPES = ("IMAGE",)
+    RETURN_NAMES = ("image",)
+    FUNCTION = "uncrop"
+    CATEGORY = "WC/masks"
+    DESCRIPTION = "Rotates a crop made by WCRotatedCrop back and composites it into the image. The crop may have been rescaled in between."
+
+    def uncrop(self, image, cropped_image, crop, cropped_mask=None):
+        """
+        Composites a rotated crop back into the image.
         
-        # Scanline fill
-        for y in range(height):
-            intersections = []
-            
-            for y1, y2, x1, x2 in edges:
-                if y1 <= y < y2:
-                    # Calculate x intersection
-                    if y2 != y1:
-                        x_intersect = x1 + (x2 - x1) * (y - y1) / (y2 - y1)
-                        intersections.append(x_intersect)
-            
-            # Sort intersections and fill between pairs
-            intersections.sort()
-            for i in range(0, len(intersections), 2):
-                if i + 1 < len(intersections):
-                    x_start = max(0, int(intersections[i]))
-                    x_end = min(width - 1, int(intersections[i + 1]))
-                    if x_start <= x_end:
-                        mask[y, x_start:x_end + 1] = 1.0
+        Args:
+            image: Destination image tensor [B, H, W, C], the image the crop was made from
+            cropped_image: The (processed) crop [B, h, w, C], any size
+            crop: Crop description from WCRotatedCrop
+            cropped_mask: Optional blend mask in crop space [B, h', w']
+        
+        Returns:
+            The image with the crop composited back
+        """
+        center_x, center_y, rect_width, rect_height, angle = crop["rect"]
+        _, height, width, _ = image.shape
+        device = image.device
+        result = image.clone()
+        
+        # Only the axis-aligned bounds of the rotated rectangle can change
+        cos_a, sin_a = _rect_axes(angle)
+        extent_x = (abs(rect_width * cos_a) + abs(rect_height * sin_a)) / 2
+        extent_y = (abs(rect_width * sin_a) + abs(rect_height * cos_a)) / 2
+        x0, x1 = max(0, math.floor(center_x - extent_x)), min(width, math.ceil(center_x + extent_x) + 1)
+        y0, y1 = max(0, math.floor(center_y - extent_y)), min(height, math.ceil(center_y + extent_y) + 1)
+        if x0 >= x1 or y0 >= y1:
+            return (result,)
+        
+        # Position of every destination pixel in normalized crop coordinates
+        y_coords, x_coords = _pixel_coords(y0, y1, x1 - x0, device)
+        x_coords = x_coords + x0
+        dx, dy = x_coords - center_x, y_coords - center_y
+        local_u = dx * cos_a + dy * sin_a
+        local_v = dy * cos_a - dx * sin_a
+        grid = torch.stack([(local_u / (rect_width / 2)).expand(y1 - y0, -1), (local_v / (rect_height / 2)).expand(-1, x1 - x0)], dim=-1)
+        grid = grid.unsqueeze(0).expand(cropped_image.shape[0], -1, -1, -1).to(cropped_image.dtype)
+        
+        source = torch.nn.functional.grid_sample(cropped_image.movedim(-1, 1), grid, mode='bilinear', padding_mode='border', align_corners=False).movedim(1, -1)
+        inside = ((local_u.abs() <= rect_width / 2) & (local_v.abs() <= rect_height / 2)).float()
+        if cropped_mask is not None:
+            cropped_mask = cropped_mask.reshape((-1, cropped_mask.shape[-2], cropped_mask.shape[-1]))
+            mask_grid = grid[:1].expand(cropped_mask.shape[0], -1, -1, -1).to(cropped_mask.dtype)
+            alpha = torch.nn.functional.grid_sample(cropped_mask.unsqueeze(1), mask_grid, mode='bilinear', padding_mode='zeros', align_corners=False).squeeze(1) * inside
+        else:
+            alpha = inside.unsqueeze(0)
+        alpha = alpha.unsqueeze(-1).to(image.dtype)
+        region = result[:, y0:y1, x0:x1]
+        result[:, y0:y1, x0:x1] = region * (1 - alpha) + source.to(image.dtype) * alpha
+        return (result,)
+
+
+def signed_distance_field(mask):
+    """
+    Computes the exact Euclidean signed distance field of a 2D mask (non-zero pixels are inside).
+    Outside pixels hold the distance to the nearest inside pixel, inside pixels hold minus the distance
+    to the nearest outside pixel, so the field is never 0.  An empty mask is +inf everywhere, a full one -inf.
+
+    Args:
+        mask: 2D numpy array
+
+    Returns:
+        float32 numpy array of the same shape
+    """
+    inside = mask > 0
+    if not np.any(inside):
+        return np.full(mask.shape, np.inf, dtype=np.float32)
+    if np.all(inside):
+        return np.full(mask.shape, -np.inf, dtype=np.float32)
+    outside_distance = ndimage.distance_transform_edt(~inside)
+    inside_distance = ndimage.distance_transform_edt(inside)
+    return (outside_distance - inside_distance).astype(np.float32)
+
+
+def mask_from_distance_field(field, mode, radius, feather=0.0):
+    """
+    Derives a mask from a signed distance field with a single threshold or clamp.
+
+    Args:
+        field: Signed distance field tensor, as produced by signed_distance_field
+        mode: "grow", "shrink", "feather" or "band"
+        radius: Distance in pixels
+        feather: Width in pixels of the linear falloff outside the grown edge ("feather" mode only)
+
+    Returns:
+        A float mask tensor of the same shape
+    """
+    if mode == "grow":
+        # Every pixel within radius of the mask, ie a dilation by a disk
+        return (field <= radius).float()
+    elif mode == "shrink":
+        # Every inside pixel further than radius from the outside, ie an erosion by a disk
+        return (field < -radius).float()
+    elif mode == "feather":
+        if feather <= 0:
+            return (field <= radius).float()
+        return ((radius + feather - field) / feather).clamp(0.0, 1.0)
+    elif mode == "band":
+        # Pixels within radius of the mask edge, on either side
+        return (field.abs() <= radius).float()
+    raise ValueError(f"Unknown distance field mode: {mode}")
+
+
+class WCMaskDistanceField:
+    """
+    Computes the exact Euclidean signed distance field of a mask, from which WCMaskFromDistanceField can derive
+    grown, shrunk, feathered or band masks at any radius without another full-resolution morphology pass.
+    """
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "mask": ("MASK",),
+            }
+        }
+
+    RETURN_TYPES = ("WC_DISTANCE_FIELD",)
+    RETURN_NAMES = ("distance_field",)
+    FUNCTION = "create_distance_field"
+    CATEGORY = "WC/masks"
+    DESCRIPTION = "Computes the signed distance (in pixels) of every pixel to the edge of the mask: positive outside, negative inside. Feed it to any number of WCMaskFromDistanceField nodes to grow/shrink/feather the mask at different radii."
+
+    def create_distance_field(self, mask):
+        """
+        Computes the signed distance field of each mask in the batch.
+        
+        Args:
+            mask: Input mask tensor [B, H, W] or [H, W]
         
-        return mask
+        Returns:
+            A float32 distance field tensor [B, H, W]
+        """
+        mask = mask.reshape((-1, mask.shape[-2], mask.shape[-1]))
+        mask_np = mask.cpu().numpy()
+        field = np.stack(map_items(lambda b: signed_distance_field(mask_np[b]), mask_np.shape[0], mask_np.shape[1] * mask_np.shape[2]))
+        return (torch.from_numpy(field).to(mask.device),)
+
+
+class WCMaskFromDistanceField:
+    """
+    Derives a mask from a signed distance field computed by WCMaskDistanceField.
+    """
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "distance_field": ("WC_DISTANCE_FIELD",),
+                "mode": (["grow", "shrink", "feather", "band"], {"default": "grow", "tooltip": "grow: pixels within radius of the mask, shrink: mask pixels further than radius from its edge, feather: grow with a linear falloff of 'feather' pixels, band: pixels within radius of the mask edge."}),
+                "radius": ("FLOAT", {"default": 16.0, "min": 0.0, "max": 4096.0, "step": 1.0, "tooltip": "Distance in pixels."}),
+            },
+            "optional": {
+                "feather": ("FLOAT", {"default": 0.0, "min": 0.0, "max": 4096.0, "step": 1.0, "tooltip": "Width in pixels of the falloff beyond the grown edge (feather mode only)."}),
+            }
+        }
+
+    RETURN_TYPES = ("MASK",)
+    RETURN_NAMES = ("mask",)
+    FUNCTION = "create_mask"
+    CATEGORY = "WC/masks"
+
+    def create_mask(self, distance_field, mode, radius, feather=0.0):
+        return (mask_from_distance_field(distance_field, mode, radius, feather),)
+
 
 class WCMaskOverlay:
     """
@@ -968,8 +2608,9 @@ class WCMaskOverlay:
                 "mask": ("MASK",),
             },
             "optional": {
-                "color": (["auto", "fuschia", "red", "green", "blue", "yellow", "cyan", "white", "black"], {"default": "auto", "tooltip": "Color for the mask overlay. 'auto' selects high-contrast color based on image content."}),
+                "color": (["auto", "palette", "fuschia", "red", "green", "blue", "yellow", "cyan", "white", "black"], {"default": "auto", "tooltip": "Color for the mask overlay. 'auto' selects high-contrast color based on image content. 'palette' overlays several segments on each image, each in its own color. The mask batch holds the segments one after another, either one mask per image each (as joined by WCMaskBatch) or one mask per segment."}),
                 "opacity": ("FLOAT", {"default": 0.5, "min": 0.0, "max": 1.0, "step": 0.01, "tooltip": "Opacity of the mask overlay (0.0 = transparent, 1.0 = opaque)."}),
+                "max_preview_edge": ("INT", {"default": 0, "min": 0, "max": 16384, "step": 8, "tooltip": "If set, the image and mask are first downscaled (area averaging) so their longest edge is at most this many pixels, and the overlay is made at that size. 0 keeps the full resolution."}),
             }
         }
 
@@ -978,7 +2619,7 @@ class WCMaskOverlay:
     FUNCTION = "overlay_mask"
     CATEGORY = "WC/masks"
 
-    def overlay_mask(self, image, mask, color="auto", opacity=0.5):
+    def overlay_mask(self, image, mask, color="auto", opacity=0.5, max_preview_edge=0):
         """
         Overlays a mask on an image with the specified color and opacity.
         
@@ -987,6 +2628,7 @@ class WCMaskOverlay:
             mask: Input mask tensor [B, H, W] or [H, W]
             color: Color for the mask overlay
             opacity: Opacity of the mask overlay (0.0-1.0)
+            max_preview_edge: If > 0, the longest edge of the result (the inputs are downscaled first)
         
         Returns:
             Image tensor with mask overlaid
@@ -995,12 +2637,20 @@ class WCMaskOverlay:
         if len(image.shape) == 3:
             image = image.unsqueeze(0)
         
-        batch_size, height, width, channels = image.shape
-        
         # Ensure mask matches image dimensions
         if len(mask.shape) == 2:
             mask = mask.unsqueeze(0)  # Add batch dimension
         
+        # Diagnostic previews don't need full resolution, downscale before doing any work
+        if max_preview_edge > 0 and max(image.shape[1], image.shape[2]) > max_preview_edge:
+            scale = max_preview_edge / max(image.shape[1], image.shape[2])
+            size = (max(1, round(image.shape[1] * scale)), max(1, round(image.shape[2] * scale)))
+            image = torch.nn.functional.interpolate(image.movedim(-1, 1), size=size, mode='area').movedim(1, -1)
+            mask = torch.nn.functional.interpolate(mask.unsqueeze(1), size=size, mode='area').squeeze(1)
+        
+        batch_size, height, width, channels = image.shape
+        
+        
         # Resize mask to match image if needed
         if mask.shape[1] != height or mask.shape[2] != width:
             mask = torch.nn.functional.interpolate(
@@ -1010,10 +2660,13 @@ class WCMaskOverlay:
                 align_corners=False
             ).squeeze(1)
         
+        if color == "palette":
+            return (self._overlay_palette(image, mask, opacity),)
+        
         # Ensure mask batch size matches image
         if mask.shape[0] != batch_size:
             if mask.shape[0] == 1:
-                mask = mask.repeat(batch_size, 1, 1)
+                mask = mask.expand(batch_size, -1, -1)
             else:
                 mask = mask[:batch_size]
         
@@ -1026,24 +2679,75 @@ class WCMaskOverlay:
         else:
             overlay_color = self._get_color_values(color)
         
+        overlay_color = overlay_color.to(device=image.device, dtype=image.dtype)
+        keep, opacity = _scalar(1 - opacity, image.device), _scalar(opacity, image.device)
+        
         # Apply mask overlay for each batch item
         for b in range(batch_size):
             mask_b = mask[b]  # [H, W]
             
-            # Create color overlay where mask is active
-            mask_active = mask_b > 0  # Boolean mask for active regions
+            # Only blend items that have active (> 0) mask regions
+            cols, _ = mask_occupancy(mask_b, torch.gt)
+            if not torch.any(cols):
+                continue
             
-            if torch.any(mask_active):
+            # Blend in row bands to bound the size of the per-pixel temporaries
+            for y0, y1 in row_bands(height, width, 32):
                 # Apply color overlay with opacity blending
                 # Blend: result = (1 - alpha) * original + alpha * overlay_color
                 # where alpha = opacity * mask_strength
-                alpha = mask_b.clone()
-                alpha[mask_active] = mask_b[mask_active] * (1 - opacity) + opacity
-                for c in range(channels):
-                    result[b, :, :, c] = (1 - alpha) * result[b, :, :, c] + alpha * overlay_color[c]
+                run_kernel(_blend_kernel, (y1 - y0) * width, result[b, y0:y1], mask_b[y0:y1], overlay_color, keep, opacity, out=result[b, y0:y1])
         
         return (result,)
     
+    def _overlay_palette(self, image, masks, opacity):
+        """
+        Overlays every segment of a mask batch on the images [B, H, W, C] in one pass, segment i in palette
+        color i (cycling), so N segments produce one composite instead of N separate overlays.  A batch of
+        N * B masks (e.g. B-frame segment masks joined by WCMaskBatch) holds the B frames of each segment in
+        turn, so mask s * B + b is segment s of image b.  Any other batch size is one mask per segment, shared
+        by every image.
+        """
+        batch_size, height, width, channels = image.shape
+        result = image.clone()
+        if masks.shape[0] % batch_size == 0:
+            masks = masks.reshape((-1, batch_size, height, width))
+        else:
+            masks = masks.unsqueeze(1).expand(-1, batch_size, -1, -1)
+        colors = torch.stack([self.PALETTE[i % len(self.PALETTE)] for i in range(masks.shape[0])])
+        if channels != 3:
+            colors = (colors @ torch.tensor([0.299, 0.587, 0.114])).unsqueeze(-1).expand(-1, channels)
+        colors = colors.to(device=image.device, dtype=image.dtype)
+        masks = masks.to(device=image.device, dtype=image.dtype)
+        keep, opacity = _scalar(1 - opacity, image.device), _scalar(opacity, image.device)
+        for b in range(batch_size):
+            # Empty masks add nothing, the others keep the color of their segment so a segment's color does
+            # not depend on which other segments were found
+            indices = torch.nonzero(torch.amax(masks[:, b].reshape(masks.shape[0], -1), dim=1) > 0, as_tuple=True)[0].tolist()
+            if not indices:
+                continue
+            frame_masks, frame_colors = masks[indices, b], colors[indices]
+            # Only the bounds of the union of the masks can change
+            cols, rows = mask_occupancy(torch.amax(frame_masks, dim=0), torch.gt)
+            (x0, x1), (y_start, y_end) = occupancy_extent(cols), occupancy_extent(rows)
+            x1, y_end = x1 + 1, y_end + 1
+            for y0, y1 in row_bands(y_end - y_start, x1 - x0, 32 + 12 * len(indices)):
+                y0, y1 = y0 + y_start, y1 + y_start
+                run_kernel(_palette_blend_kernel, (y1 - y0) * (x1 - x0), result[b, y0:y1, x0:x1], frame_masks[:, y0:y1, x0:x1], frame_colors, keep, opacity, out=result[b, y0:y1, x0:x1])
+        return result
+
+    # Distinct segment colors for palette mode, in order
+    PALETTE = [
+        torch.tensor([1.0, 0.0, 0.0]),
+        torch.tensor([0.0, 1.0, 0.0]),
+        torch.tensor([0.0, 0.4, 1.0]),
+        torch.tensor([1.0, 1.0, 0.0]),
+        torch.tensor([1.0, 0.0, 1.0]),
+        torch.tensor([0.0, 1.0, 1.0]),
+        torch.tensor([1.0, 0.5, 0.0]),
+        torch.tensor([0.6, 0.2, 1.0]),
+    ]
+
     def _select_high_contrast_color(self, image):
         """
         Automatically select a high-contrast color based on image content.
@@ -1128,10 +2832,185 @@ class WCMaskOverlay:
         
         return color_map.get(color_name, torch.tensor([1.0, 0.0, 1.0]))  # Default to fuschia
 
+class WCMaskBatch:
+    """
+    Joins two masks (or mask batches) into one batch, e.g. to collect detailer segments for a palette overlay.
+    """
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "mask_a": ("MASK",),
+                "mask_b": ("MASK",),
+            }
+        }
+
+    RETURN_TYPES = ("MASK",)
+    RETURN_NAMES = ("mask",)
+    FUNCTION = "batch"
+    CATEGORY = "WC/masks"
+    DESCRIPTION = "Appends mask_b to mask_a as a batch. mask_b is resized to mask_a's size if they differ. Chain several to collect more masks."
+
+    def batch(self, mask_a, mask_b):
+        mask_a = mask_a.reshape((-1, mask_a.shape[-2], mask_a.shape[-1]))
+        mask_b = mask_b.reshape((-1, mask_b.shape[-2], mask_b.shape[-1]))
+        if mask_b.shape[1:] != mask_a.shape[1:]:
+            mask_b = torch.nn.functional.interpolate(mask_b.unsqueeze(1), size=mask_a.shape[1:], mode='bilinear', align_corners=False).squeeze(1)
+        return (torch.cat([mask_a, mask_b.to(device=mask_a.device, dtype=mask_a.dtype)]),)
+
+
+# Integer views used to compare mask values bit for bit, so -0.0, NaN payloads etc. survive a round trip
+_RLE_BIT_VIEWS = {1: torch.uint8, 2: torch.int16, 4: torch.int32, 8: torch.int64}
+_RLE_MAGIC = b"WCRLE1"
+
+
+class MaskRLE:
+    """
+    Run-length encoding of a mask batch in row-major order.  Runs are found on the integer bit pattern of
+    the values, so decoding gives back a bit-identical tensor.  Binary detailer masks usually have a few
+    runs per row, making this orders of magnitude smaller than the float32 mask.
+    """
+    def __init__(self, shape, dtype, values, lengths):
+        self.shape = tuple(shape)
+        self.dtype = dtype
+        # Bit patterns of the run values (integer tensor) and the run lengths (int64 tensor)
+        self.values = values
+        self.lengths = lengths
+
+    @classmethod
+    def encode(cls, mask):
+        """Encodes a mask tensor of any shape and dtype."""
+        flat = mask.detach().contiguous().view(_RLE_BIT_VIEWS[mask.element_size()]).reshape(-1)
+        if flat.numel() == 0:
+            return cls(mask.shape, mask.dtype, flat, torch.zeros((0,), dtype=torch.int64, device=flat.device))
+        starts = torch.ones_like(flat, dtype=torch.bool)
+        torch.ne(flat[1:], flat[:-1], out=starts[1:])
+        starts = torch.nonzero(starts, as_tuple=True)[0]
+        ends = torch.cat([starts[1:], starts.new_tensor([flat.numel()])])
+        return cls(mask.shape, mask.dtype, flat[starts], ends - starts)
+
+    def decode(self, device=None):
+        """Decodes back to a mask tensor, on the device of the encoded runs unless 'device' is given."""
+        values, lengths = self.values, self.lengths
+        if device is not None:
+            values, lengths = values.to(device), lengths.to(device)
+        return torch.repeat_interleave(values, lengths).view(self.dtype).reshape(self.shape)
+
+    @property
+    def run_count(self):
+        return self.lengths.shape[0]
+
+    @property
+    def nbytes(self):
+        """Size of the encoded runs in memory."""
+        return self.values.numel() * self.values.element_size() + self.lengths.numel() * self.lengths.element_size()
+
+    def to_bytes(self):
+        """
+        Serializes to a compact byte string: a header with the dtype and shape, then the run lengths as
+        uint32 and the run values.  Runs longer than 2^32-1 are split, which never changes the decoded mask.
+        """
+        values = self.values.cpu().numpy()
+        lengths = self.lengths.cpu().numpy()
+        limit = np.iinfo(np.uint32).max
+        if len(lengths) and lengths.max() > limit:
+            splits = (lengths + limit - 1) // limit
+            values = np.repeat(values, splits)
+            full = np.full(splits.sum(), limit, dtype=np.int64)
+            last = np.cumsum(splits) - 1
+            full[last] = lengths - (splits - 1) * limit
+            lengths = full
+        dtype_name = str(self.dtype).replace("torch.", "").encode()
+        header = np.array([len(dtype_name), len(self.shape), len(lengths)] + list(self.shape), dtype=np.int64)
+        return b"".join([_RLE_MAGIC, header.tobytes(), dtype_name, lengths.astype(np.uint32).tobytes(), values.tobytes()])
+
+    @classmethod
+    def from_bytes(cls, data):
+        """Deserializes a byte string written by to_bytes."""
+        if data[:len(_RLE_MAGIC)] != _RLE_MAGIC:
+            raise ValueError("Not a WC RLE mask")
+        offset = len(_RLE_MAGIC)
+        name_length, ndim, run_count = np.frombuffer(data, dtype=np.int64, count=3, offset=offset)
+        shape = np.frombuffer(data, dtype=np.int64, count=ndim, offset=offset + 24)
+        offset += 24 + 8 * int(ndim)
+        dtype = getattr(torch, data[offset:offset + name_length].decode())
+        offset += int(name_length)
+        lengths = np.frombuffer(data, dtype=np.uint32, count=run_count, offset=offset)
+        offset += 4 * int(run_count)
+        bit_view = _RLE_BIT_VIEWS[torch.empty((), dtype=dtype).element_size()]
+        values = torch.frombuffer(bytearray(data[offset:]), dtype=bit_view) if run_count else torch.zeros((0,), dtype=bit_view)
+        return cls(shape.tolist(), dtype, values, torch.from_numpy(lengths.astype(np.int64)))
+
+
+def save_mask_rle(path, mask):
+    """Saves a mask tensor (or MaskRLE) run-length encoded to 'path'."""
+    rle = mask if isinstance(mask, MaskRLE) else MaskRLE.encode(mask)
+    with open(path, "wb") as file:
+        file.write(rle.to_bytes())
+
+
+def load_mask_rle(path, decode=True):
+    """Loads a mask saved by save_mask_rle, decoded to a tensor unless 'decode' is False."""
+    with open(path, "rb") as file:
+        rle = MaskRLE.from_bytes(file.read())
+    return rle.decode() if decode else rle
+
+
+class WCMaskToRLE:
+    """
+    Converts a mask to a run-length encoded WC_RLE value, which is bit-exact, cheap to hold in memory and
+    can be written to disk with save_mask_rle.
+    """
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "mask": ("MASK",),
+            }
+        }
+
+    RETURN_TYPES = ("WC_RLE", "INT")
+    RETURN_NAMES = ("rle", "bytes")
+    FUNCTION = "encode"
+    CATEGORY = "WC/masks"
+    DESCRIPTION = "Run-length encodes the mask (bit-exact). Returns the encoded mask and its encoded size in bytes."
+
+    def encode(self, mask):
+        rle = MaskRLE.encode(mask)
+        return (rle, rle.nbytes)
+
+
+class WCRLEToMask:
+    """
+    Decodes a WC_RLE value created by WCMaskToRLE back to the original mask.
+    """
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "rle": ("WC_RLE",),
+            }
+        }
+
+    RETURN_TYPES = ("MASK",)
+    RETURN_NAMES = ("mask",)
+    FUNCTION = "decode"
+    CATEGORY = "WC/masks"
+    DESCRIPTION = "Decodes a run-length encoded mask back to the exact mask it was created from."
+
+    def decode(self, rle):
+        return (rle.decode(),)
+
+
 NODE_CLASS_MAPPINGS = {
     "WCCompositeMask": WCCompositeMask,
     "WCMaskBounds": WCMaskBounds,
+    "WCMaskIntegral": WCMaskIntegral,
+    "WCCropToMask": WCCropToMask,
+    "WCCroppedMask": WCCroppedMask,
+    "WCCropToFrameBounds": WCCropToFrameBounds,
     "WCSkipIfMaskEmpty": WCSkipIfMaskEmpty,
+    "WCMaskStats": WCMaskStats,
     "WCSeparateMaskComponents": WCSeparateMaskComponents,
     "WCBoxMask": WCBoxMask,
     "WCBoundingBoxMask": WCBoundingBoxMask,
@@ -1140,5 +3019,13 @@ NODE_CLASS_MAPPINGS = {
     "WCOvalMask": WCOvalMask,
     "WCBoundingOvalMask": WCBoundingOvalMask,
     "WCHullMask": WCHullMask,
+    "WCOrientedBoundingBoxMask": WCOrientedBoundingBoxMask,
+    "WCRotatedCrop": WCRotatedCrop,
+    "WCRotatedUncrop": WCRotatedUncrop,
+    "WCMaskDistanceField": WCMaskDistanceField,
+    "WCMaskFromDistanceField": WCMaskFromDistanceField,
     "WCMaskOverlay": WCMaskOverlay,
-}
\ No newline at end of file
+    "WCMaskBatch": WCMaskBatch,
+    "WCMaskToRLE": WCMaskToRLE,
+    "WCRLEToMask": WCRLEToMask,
+}
@@ -0,0 +1,8 @@
+"""
+Command line tools and a plain Python API for the WC mask nodes: batch processing of mask files, kernel
+benchmarks and the memory regression check.  They live outside wcnodes.py so ComfyUI does not load them with
+the nodes; this package is in the node folder, so ComfyUI imports this file only and it must stay light.
+"""
+
+# No nodes here
+NODE_CLASS_MAPPINGS = {}
@@ -0,0 +1,73 @@
+"""
+Command line tools for the WC mask nodes, run from the WCNodes folder:
+    python -m wctools --help
+"""
+import ast
+import os
+import sys
+from wctools.api import OPERATIONS, operation_needs_image, operation_needs_mask, process_directory
+from wctools.diagnostics import MEMORY_BASELINE_PATH, bench_kernels, bench_rle, memcheck
+
+
+def _parse_param(text):
+    name, _, value = text.partition("=")
+    try:
+        return name, ast.literal_eval(value)
+    except (ValueError, SyntaxError):
+        return name, value
+
+
+def main(argv=None):
+    """Command line entry point, run `python -m wctools --help` (from the WCNodes folder) for the available commands."""
+    import argparse
+    parser = argparse.ArgumentParser(prog="python -m wctools", description="WC mask node utilities.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    bench = commands.add_parser("bench-kernels", help="Benchmark eager vs compiled (WC_COMPILE_KERNELS) mask kernels on CPU.")
+    bench.add_argument("--size", type=int, default=2048, help="Canvas width and height in pixels.")
+    bench.add_argument("--repeat", type=int, default=10, help="Timed calls per kernel, the best one is reported.")
+    bench = commands.add_parser("bench-rle", help="Benchmark run-length encoding and decoding of masks on CPU.")
+    bench.add_argument("--size", type=int, default=2048, help="Mask width and height in pixels.")
+    bench.add_argument("--repeat", type=int, default=10, help="Timed calls per operation, the best one is reported.")
+    check = commands.add_parser("memcheck", help="Check the peak CPU memory of every node against the stored baseline.",
+                                description="Measures the peak CPU memory (torch allocations and Python allocations) of every node and compares it with the baseline. "
+                                            "A case fails when a peak exceeds its baseline by more than --tolerance (10%% by default) plus 64KB. "
+                                            "Peaks depend on the machine and torch build, so the baseline is not committed: the first run writes it "
+                                            "(cases added later are appended), and --update refreshes it, e.g. on the base commit before checking a change.")
+    check.add_argument("--baseline", default=MEMORY_BASELINE_PATH, help="Baseline JSON file, written on the first run.")
+    check.add_argument("--tolerance", type=float, default=0.1, help="Allowed peak increase over the baseline, as a fraction (default 0.1).")
+    check.add_argument("--update", action="store_true", help="Rewrite the baseline from this run instead of checking.")
+    check.add_argument("--sizes", type=int, nargs="+", default=[512, 1024], help="Canvas sizes to measure.")
+    check.add_argument("--batches", type=int, nargs="+", default=[1, 4], help="Batch sizes to measure.")
+    process = commands.add_parser("process", help="Run an operation over a directory of mask PNGs with a process pool.")
+    process.add_argument("operation", choices=sorted(OPERATIONS), help="Operation to run.")
+    process.add_argument("masks", help="Directory of mask PNGs. For the shape operations (box, circle, oval), which take no mask, the directory of image PNGs.")
+    process.add_argument("output", help="Directory to write the outputs, results.jsonl and summary.json to.")
+    process.add_argument("--images", help="Directory of image PNGs with the same file names as the masks (needed by crop, rotated-crop and overlay).")
+    process.add_argument("--param", action="append", default=[], metavar="NAME=VALUE", help="Operation input, can be repeated (e.g. --param grow=16).")
+    process.add_argument("--workers", type=int, default=None, help="Worker processes, defaults to the CPU count. 0 runs in this process.")
+    process.add_argument("--max-in-flight", type=int, default=None, help="Maximum files loaded at once, defaults to twice the workers.")
+    args = parser.parse_args(argv)
+    if args.command == "bench-kernels":
+        bench_kernels(args.size, args.repeat)
+    elif args.command == "bench-rle":
+        bench_rle(args.size, args.repeat)
+    elif args.command == "memcheck":
+        failures = memcheck(args.baseline, args.tolerance, args.update, args.sizes, args.batches)
+        return 1 if failures else 0
+    elif args.command == "process":
+        images = args.images
+        if not operation_needs_mask(args.operation):
+            images = args.masks
+        elif operation_needs_image(args.operation) and not images:
+            parser.error(f"the {args.operation} operation needs --images")
+        params = dict(_parse_param(p) for p in args.param)
+        summary = process_directory(args.operation, args.masks, args.output, images, params, args.workers, args.max_in_flight)
+        print(f"{summary['files']} files ({summary['failed']} failed) in {summary['wall_seconds']:.2f}s, {summary['files_per_second']:.1f} files/s, see {os.path.join(args.output, 'results.jsonl')}")
+        for stage, timing in summary["timings"].items():
+            print(f"  {stage:<5}{timing['mean_ms']:>10.2f} ms mean{timing['p95_ms']:>10.2f} ms p95")
+        return 1 if summary["failed"] else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,203 @@
+"""
+Plain Python API over the node logic, usable without a ComfyUI graph:
+    outputs = run_operation("bounds", mask, grow=16)  ->  {"x": ..., "y": ..., "width": ..., ...}
+Missing node inputs get the node's defaults.  Masks are [B, H, W] and images [B, H, W, C] float tensors.
+The shape operations (box, circle, oval) only take an image.  Nodes that need a second mask or a WC_* input,
+or only produce one, are not operations: WCCompositeMask, WCMaskBatch, WCSkipIfMaskEmpty, WCCroppedMask,
+WCCropToFrameBounds, WCRotatedUncrop, WCMaskIntegral, the distance field nodes and the RLE nodes.
+"""
+import os
+import time
+import torch
+import numpy as np
+from wcnodes import (WCBoundingBoxMask, WCBoundingCircleMask, WCBoundingOvalMask, WCBoxMask, WCCircleMask, WCCropToMask,
+                     WCHullMask, WCMaskBounds, WCMaskOverlay, WCMaskStats, WCOrientedBoundingBoxMask, WCOvalMask,
+                     WCRotatedCrop, WCSeparateMaskComponents)
+
+OPERATIONS = {
+    "bounds": WCMaskBounds,
+    "stats": WCMaskStats,
+    "crop": WCCropToMask,
+    "components": WCSeparateMaskComponents,
+    "bounding-box": WCBoundingBoxMask,
+    "bounding-circle": WCBoundingCircleMask,
+    "bounding-oval": WCBoundingOvalMask,
+    "oriented-box": WCOrientedBoundingBoxMask,
+    "rotated-crop": WCRotatedCrop,
+    "hull": WCHullMask,
+    "overlay": WCMaskOverlay,
+    "box": WCBoxMask,
+    "circle": WCCircleMask,
+    "oval": WCOvalMask,
+}
+
+
+def operation_needs_image(op):
+    return "image" in OPERATIONS[op].INPUT_TYPES()["required"]
+
+
+def operation_needs_mask(op):
+    return "mask" in OPERATIONS[op].INPUT_TYPES()["required"]
+
+
+def run_operation(op, mask=None, image=None, **params):
+    """
+    Runs one of the OPERATIONS on a mask and/or image, whichever the operation takes.
+
+    Args:
+        op: Operation name, a key of OPERATIONS
+        mask: Mask tensor, required by every operation except the shapes
+        image: Image tensor, required by crop, rotated-crop, overlay and the shapes
+        params: Node inputs, anything not given uses the node's default
+
+    Returns:
+        Dict of output name -> value
+    """
+    node_class = OPERATIONS[op]
+    inputs = {}
+    if mask is not None and operation_needs_mask(op):
+        inputs["mask"] = mask
+    if image is not None and operation_needs_image(op):
+        inputs["image"] = image
+    for name, spec in node_class.INPUT_TYPES()["required"].items():
+        if name in inputs or name in params:
+            continue
+        if name in ("image", "mask"):
+            raise ValueError(f"Operation '{op}' needs {'an' if name == 'image' else 'a'} {name}")
+        if isinstance(spec[0], list):
+            params[name] = spec[0][0]
+        else:
+            params[name] = spec[1]["default"]
+    outputs = getattr(node_class(), node_class.FUNCTION)(**inputs, **params)
+    return dict(zip(node_class.RETURN_NAMES, outputs))
+
+
+def load_mask_png(path):
+    """Loads a PNG as a [1, H, W] float mask (luminance, 0-1)."""
+    from PIL import Image
+    with Image.open(path) as img:
+        return torch.from_numpy(np.asarray(img.convert("L"), dtype=np.float32) / 255.0).unsqueeze(0)
+
+
+def load_image_png(path):
+    """Loads a PNG as a [1, H, W, 3] float image (0-1)."""
+    from PIL import Image
+    with Image.open(path) as img:
+        return torch.from_numpy(np.asarray(img.convert("RGB"), dtype=np.float32) / 255.0).unsqueeze(0)
+
+
+def save_png(path, tensor):
+    """Saves the first item of a mask [B, H, W] or image [B, H, W, C] tensor as an 8-bit PNG."""
+    from PIL import Image
+    if tensor.dim() >= 3:
+        tensor = tensor[0]
+    pixels = (tensor.detach().float().clamp(0, 1) * 255).round().to(torch.uint8).cpu().numpy()
+    Image.fromarray(pixels).save(path)
+
+
+def _json_value(value):
+    """Converts a node output to something json can write, or None for values that are not data."""
+    if isinstance(value, (bool, int, float, str)) or value is None:
+        return value
+    if isinstance(value, (list, tuple)):
+        return [_json_value(v) for v in value]
+    if isinstance(value, dict):
+        return {k: _json_value(v) for k, v in value.items()}
+    if isinstance(value, (np.generic,)):
+        return value.item()
+    return None
+
+
+def process_file(op, mask_path, image_path, output_dir, params):
+    """
+    Runs an operation on one mask PNG and/or image PNG and writes its tensor outputs as PNGs to output_dir.
+    Used by the process command, runs in the worker processes.
+
+    Returns:
+        Result record with the file, scalar outputs, written files and load/run/save timings in seconds
+    """
+    name = os.path.basename(mask_path or image_path)
+    stem = os.path.splitext(name)[0]
+    record = {"file": name}
+    try:
+        start = time.perf_counter()
+        mask = load_mask_png(mask_path) if mask_path else None
+        image = load_image_png(image_path) if image_path else None
+        loaded = time.perf_counter()
+        outputs = run_operation(op, mask, image, **params)
+        ran = time.perf_counter()
+        tensors = {name: value for name, value in outputs.items() if isinstance(value, torch.Tensor)}
+        record["outputs"] = {name: _json_value(value) for name, value in outputs.items() if name not in tensors}
+        record["written"] = []
+        for name, tensor in tensors.items():
+            filename = f"{stem}.png" if len(tensors) == 1 else f"{stem}_{name}.png"
+            save_png(os.path.join(output_dir, filename), tensor)
+            record["written"].append(filename)
+        saved = time.perf_counter()
+        record["timings"] = {"load": loaded - start, "run": ran - loaded, "save": saved - ran}
+    except Exception as e:
+        record["error"] = f"{type(e).__name__}: {e}"
+    return record
+
+
+def _init_process_worker():
+    # One thread per worker process, the pool provides the parallelism
+    torch.set_num_threads(1)
+
+
+def process_directory(op, mask_dir, output_dir, image_dir=None, params=None, workers=None, max_in_flight=None):
+    """
+    Streams every PNG mask in mask_dir (paired by file name with the PNG images in image_dir, if the operation
+    takes an image) through an operation with a process pool, holding at most max_in_flight files in memory at
+    once.  Operations without a mask input (the shapes) stream the PNG images in image_dir instead.
+    Writes the output PNGs, a results.jsonl record per file and a summary.json with timings to output_dir.
+
+    Returns:
+        The summary dict
+    """
+    import json
+    from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+    params = params or {}
+    if workers is None:
+        workers = os.cpu_count() or 1
+    max_in_flight = max_in_flight or max(1, workers) * 2
+    needs_mask, needs_image = operation_needs_mask(op), operation_needs_image(op)
+    if needs_image and image_dir is None:
+        raise ValueError(f"Operation '{op}' needs an image directory")
+    os.makedirs(output_dir, exist_ok=True)
+    jobs = (
+        (op, os.path.join(mask_dir, name) if needs_mask else None, os.path.join(image_dir, name) if needs_image else None, output_dir, params)
+        for name in sorted(os.listdir(mask_dir if needs_mask else image_dir)) if name.lower().endswith(".png")
+    )
+    records = []
+    start = time.perf_counter()
+    with open(os.path.join(output_dir, "results.jsonl"), "w") as results:
+        def finish(record):
+            records.append(record)
+            results.write(json.dumps(record) + "\n")
+        if workers <= 0:
+            for job in jobs:
+                finish(process_file(*job))
+        else:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_process_worker) as executor:
+                pending = set()
+                for job in jobs:
+                    if len(pending) >= max_in_flight:
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            finish(future.result())
+                    pending.add(executor.submit(process_file, *job))
+                for future in pending:
+                    finish(future.result())
+    wall = time.perf_counter() - start
+
+    succeeded = [r for r in records if "error" not in r]
+    summary = {"operation": op, "files": len(records), "failed": len(records) - len(succeeded), "workers": workers,
+               "wall_seconds": wall, "files_per_second": len(records) / wall if wall > 0 else 0.0, "timings": {}}
+    for stage in ("load", "run", "save"):
+        values = np.array([r["timings"][stage] for r in succeeded])
+        if len(values):
+            summary["timings"][stage] = {"mean_ms": values.mean() * 1000, "p95_ms": np.percentile(values, 95) * 1000, "total_s": values.sum()}
+    with open(os.path.join(output_dir, "summary.json"), "w") as file:
+        json.dump(summary, file, indent=2)
+    return summary
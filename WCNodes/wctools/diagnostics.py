@@ -0,0 +1,201 @@
+"""
+Benchmarks of the mask kernels and the per-node peak memory regression check.
+"""
+import os
+import time
+import torch
+import wcnodes
+from wcnodes import (MaskRLE, WCBoundingBoxMask, WCBoundingCircleMask, WCBoundingOvalMask, WCBoxMask, WCCircleMask,
+                     WCCompositeMask, WCCropToMask, WCHullMask, WCMaskBatch, WCMaskBounds, WCMaskDistanceField,
+                     WCMaskFromDistanceField, WCMaskOverlay, WCMaskStats, WCOrientedBoundingBoxMask, WCOvalMask,
+                     WCSeparateMaskComponents, _fill_circle, set_compiled_kernels)
+
+
+def _time_call(fn, repeat):
+    """Returns the best wall time in seconds of repeat calls to fn."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench_kernels(size=2048, repeat=10):
+    """
+    Benchmarks the eager and compiled versions of the per-pixel mask kernels on CPU and prints the speedups.
+    """
+    torch.manual_seed(0)
+    mask_a = torch.rand((1, size, size))
+    mask_b = torch.rand((1, size, size))
+    image = torch.rand((1, size, size, 3))
+    overlay_mask = (torch.rand((1, size, size)) > 0.5).float()
+    cases = {
+        "composite (max)": lambda: WCCompositeMask().combine(mask_a, mask_b, "max"),
+        "overlay": lambda: WCMaskOverlay().overlay_mask(image, overlay_mask, "red", 0.5),
+        "circle": lambda: WCCircleMask().create_circle_mask(image, 0.5, 0.5, 0.3, 1.0),
+        "oval": lambda: WCOvalMask().create_oval_mask(image, 0.5, 0.5, 0.4, 0.2, 1.0),
+        "bounding circle": lambda: WCBoundingCircleMask().create_bounding_circle_mask(overlay_mask[:, :size // 4, :size // 4].clone()),
+    }
+    enabled = wcnodes.COMPILE_KERNELS
+    print(f"{'kernel':<18}{'eager ms':>10}{'compiled ms':>13}{'speedup':>9}")
+    try:
+        for name, case in cases.items():
+            set_compiled_kernels(False)
+            eager = _time_call(case, repeat)
+            set_compiled_kernels(True)
+            case()  # Compile outside of the timed calls
+            compiled = _time_call(case, repeat)
+            print(f"{name:<18}{eager * 1000:>10.2f}{compiled * 1000:>13.2f}{eager / compiled:>8.2f}x")
+    finally:
+        set_compiled_kernels(enabled)
+
+
+def bench_rle(size=2048, repeat=10):
+    """
+    Benchmarks run-length encoding and decoding of a typical binary detailer mask and of a noisy soft mask
+    on CPU, and prints the throughput and the compression ratio.
+    """
+    torch.manual_seed(0)
+    blobs = torch.zeros((1, size, size))
+    for cx, cy, radius in ((0.3, 0.4, 0.15), (0.7, 0.6, 0.1), (0.5, 0.2, 0.05)):
+        blobs[0] = torch.maximum(blobs[0], _fill_circle(torch.empty((size, size)), cx * size, cy * size, size, radius))
+    cases = {
+        "binary blobs": blobs,
+        "soft noise": torch.rand((1, size, size)) * blobs,
+    }
+    print(f"{'mask':<14}{'runs':>10}{'ratio':>9}{'encode ms':>11}{'MB/s':>9}{'decode ms':>11}")
+    for name, mask in cases.items():
+        rle = MaskRLE.encode(mask)
+        assert torch.equal(rle.decode().view(torch.int32), mask.view(torch.int32))
+        encode = _time_call(lambda: MaskRLE.encode(mask), repeat)
+        decode = _time_call(rle.decode, repeat)
+        raw_bytes = mask.numel() * mask.element_size()
+        ratio = raw_bytes / len(rle.to_bytes())
+        print(f"{name:<14}{rle.run_count:>10}{ratio:>8.1f}x{encode * 1000:>11.2f}{raw_bytes / encode / 2 ** 20:>9.0f}{decode * 1000:>11.2f}")
+
+
+MEMORY_BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "memory_baseline.json")
+
+
+def _torch_peak_bytes(profiler):
+    """
+    Replays the CPU allocations and frees recorded by a torch profiler run in time order and returns the peak
+    bytes allocated above the level at the start of the run.
+    """
+    deltas = sorted(
+        (event.time_range.start, event.cpu_memory_usage if event.name == "[memory]" else event.self_cpu_memory_usage)
+        for event in profiler.events()
+    )
+    current = peak = 0
+    for _, delta in deltas:
+        current += delta
+        peak = max(peak, current)
+    return peak
+
+
+def measure_peak_memory(fn):
+    """
+    Runs fn once and measures its peak memory on CPU: the torch allocator peak from profiler memory events,
+    and the Python/numpy peak from tracemalloc.
+
+    Returns:
+        Dict with torch_peak and python_peak in bytes
+    """
+    import tracemalloc
+    from torch.profiler import profile, ProfilerActivity
+    wcnodes.clear_buffer_pool()
+    tracemalloc.start()
+    try:
+        with profile(activities=[ProfilerActivity.CPU], profile_memory=True) as profiler:
+            result = fn()
+        del result
+        _, python_peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"torch_peak": _torch_peak_bytes(profiler), "python_peak": python_peak}
+
+
+def memory_cases(sizes=(512, 1024), batches=(1, 4)):
+    """Yields (name, fn) memory check cases for the nodes at every size and batch size."""
+    for size in sizes:
+        for batch in batches:
+            generator = torch.Generator().manual_seed(0)
+            image = torch.rand((batch, size, size, 3), generator=generator)
+            soft = torch.rand((batch, size, size), generator=generator)
+            blobs = torch.zeros((batch, size, size))
+            for b in range(batch):
+                for cx, cy, radius in ((0.3, 0.4, 0.15), (0.7, 0.6, 0.1)):
+                    blobs[b] = torch.maximum(blobs[b], _fill_circle(torch.empty((size, size)), cx * size, cy * size, size, radius + b * 0.02))
+            cases = {
+                "composite": lambda: WCCompositeMask().combine(soft, blobs, "max"),
+                "bounds": lambda: WCMaskBounds().get_bounds(blobs, 16),
+                "temporal bounds": lambda: WCMaskBounds().get_bounds(blobs, 16, temporal=True),
+                "crop": lambda: WCCropToMask().crop(image, blobs, 16, 0.5, 1.0),
+                "stats": lambda: WCMaskStats().get_stats(blobs),
+                "components": lambda: WCSeparateMaskComponents().separate(blobs, "largest-smallest", 0),
+                "components min area": lambda: WCSeparateMaskComponents().separate(blobs, "largest-smallest", 0, min_area=size * size // 50),
+                "box": lambda: WCBoxMask().create_box_mask(image, 0.25, 0.25, 0.5, 0.5, 1.0),
+                "bounding box": lambda: WCBoundingBoxMask().create_bounding_box_mask(blobs),
+                "circle": lambda: WCCircleMask().create_circle_mask(image, 0.5, 0.5, 0.3, 1.0),
+                "bounding circle": lambda: WCBoundingCircleMask().create_bounding_circle_mask(blobs),
+                "oval": lambda: WCOvalMask().create_oval_mask(image, 0.5, 0.5, 0.4, 0.2, 1.0),
+                "bounding oval": lambda: WCBoundingOvalMask().create_bounding_oval_mask(blobs),
+                "hull": lambda: WCHullMask().create_hull_mask(blobs),
+                "component hulls": lambda: WCHullMask().create_hull_mask(blobs, per_component=True),
+                "oriented box": lambda: WCOrientedBoundingBoxMask().create_oriented_bounding_box_mask(blobs),
+                "distance field": lambda: WCMaskFromDistanceField().create_mask(WCMaskDistanceField().create_distance_field(blobs)[0], "feather", 8, 4),
+                "overlay": lambda: WCMaskOverlay().overlay_mask(image, blobs, "red", 0.5),
+                "palette overlay": lambda: WCMaskOverlay().overlay_mask(image, blobs, "palette", 0.5),
+                "preview overlay": lambda: WCMaskOverlay().overlay_mask(image, blobs, "auto", 0.5, max_preview_edge=256),
+                "mask batch": lambda: WCMaskBatch().batch(blobs, soft),
+                "rle": lambda: MaskRLE.encode(blobs).decode(),
+            }
+            for name, fn in cases.items():
+                yield f"{name} {size}x{size} b{batch}", fn
+
+
+def memcheck(baseline_path=MEMORY_BASELINE_PATH, tolerance=0.1, update=False, sizes=(512, 1024), batches=(1, 4)):
+    """
+    Measures the peak memory of every memory case and compares it with the stored baseline.  A case fails when
+    a peak exceeds its baseline by more than 'tolerance' (a fraction) plus 64KB of slack for allocator noise.
+    Peaks depend on the machine and torch build, so the baseline is local: cases missing from it (all of them
+    on the first run) are measured and added.  With update=True the baseline is rewritten from the
+    measurements instead.
+
+    Returns:
+        The number of failed cases
+    """
+    import json
+    baseline = {}
+    if os.path.exists(baseline_path) and not update:
+        with open(baseline_path) as file:
+            baseline = json.load(file)
+    compiled = wcnodes.COMPILE_KERNELS
+    set_compiled_kernels(False)
+    measured = {}
+    failures = 0
+    # Warm up the profiler so its one-time imports and setup are not counted against the first case
+    measure_peak_memory(lambda: torch.zeros(1))
+    print(f"{'case':<32}{'torch MB':>10}{'python MB':>11}  status")
+    try:
+        for name, fn in memory_cases(sizes, batches):
+            peaks = measure_peak_memory(fn)
+            measured[name] = peaks
+            status = "new" if name not in baseline else "ok"
+            for kind, value in peaks.items():
+                expected = baseline.get(name, {}).get(kind)
+                if expected is not None and value > expected * (1 + tolerance) + 64 * 1024:
+                    status = f"FAIL {kind} {expected / 2 ** 20:.2f} -> {value / 2 ** 20:.2f} MB"
+                    failures += 1
+                    break
+            print(f"{name:<32}{peaks['torch_peak'] / 2 ** 20:>10.2f}{peaks['python_peak'] / 2 ** 20:>11.2f}  {status}")
+    finally:
+        set_compiled_kernels(compiled)
+    added = {name: peaks for name, peaks in measured.items() if name not in baseline}
+    if update or added:
+        with open(baseline_path, "w") as file:
+            json.dump(measured if update else {**baseline, **added}, file, indent=2, sort_keys=True)
+            file.write("\n")
+        print(f"Wrote {len(measured) if update else len(added)} cases to {baseline_path}")
+    return failures